@@ -0,0 +1,247 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F, Func, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from notifications.events import publish_counters
+
+
+# Badge counts live in one UserCounters row per user, updated with F()
+# expressions wherever an item is added or read. With a COUNTERS_CACHE
+# (Redis) the rows are also cached per user, so page views usually run no
+# query at all; otherwise each page reads its user's row. Keys carry a
+# global version: changes that touch many users bump it, changes to one
+# user's row delete that user's entry.
+COUNTERS_TIMEOUT = 300  # seconds
+VERSION_KEY = 'counters:version'
+# Unix time at which the next visible announcement expires (0 = none).
+EXPIRY_KEY = 'counters:next_expiry'
+# Without a counters cache each process keeps the next expiry itself and
+# rereads it this often, so announcements added elsewhere are noticed.
+LOCAL_EXPIRY_TIMEOUT = 60  # seconds
+
+# template variable -> UserCounters field
+COUNTER_FIELDS = {
+    'unread_notification_count': 'pending_requests',
+    'unread_announcement_count': 'unread_announcements',
+    'unread_activity_count': 'unread_activities',
+}
+
+EMPTY_COUNTERS = dict.fromkeys(COUNTER_FIELDS, 0)
+
+
+def _cache():
+    alias = getattr(settings, 'COUNTERS_CACHE', 'default')
+    return caches[alias] if alias else None
+
+
+def _expiry_cache():
+    """(cache, timeout) holding the next announcement expiry."""
+    cache = _cache()
+    if cache is None:
+        return caches['local'], LOCAL_EXPIRY_TIMEOUT
+    return cache, None
+
+
+def _version(cache):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _user_key(version, user_id):
+    return f'counters:{version}:{user_id}'
+
+
+def invalidate_all_counters():
+    """Drop every user's cached counters."""
+    cache = _cache()
+    if cache is not None:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_user_counters(*user_ids):
+    """Drop the cached counters of the given users."""
+    cache = _cache()
+    if cache is None:
+        return
+    version = _version(cache)
+    cache.delete_many([_user_key(version, user_id) for user_id in user_ids])
+
+
+def _invalidate_changed(user_ids=None):
+    """Drop cached counters of ``user_ids`` (None: everyone's) after an update."""
+    def invalidate():
+        if user_ids is None:
+            invalidate_all_counters()
+        else:
+            invalidate_user_counters(*user_ids)
+
+    invalidate()
+    # Another request may cache the old row before this transaction
+    # commits, so drop the entries again once it has
+    if connection.in_atomic_block:
+        transaction.on_commit(invalidate)
+    publish_counters(user_ids)
+
+
+# ===== UPDATES =====
+
+def admin_ids():
+    from .models import User
+    return list(User.objects.filter(role='admin').values_list('pk', flat=True))
+
+
+def adjust_counters(user_ids, **deltas):
+    """Add ``deltas`` (e.g. unread_activities=1) to the users' counters."""
+    from .models import UserCounters
+
+    user_ids = list(user_ids)
+    UserCounters.objects.filter(user_id__in=user_ids).update(**{
+        field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()
+    })
+    _invalidate_changed(user_ids)
+
+
+def adjust_role_counters(roles, exclude_user_id=None, **deltas):
+    """Add ``deltas`` to the counters of every user with one of ``roles``."""
+    from .models import UserCounters
+
+    rows = UserCounters.objects.filter(role__in=roles)
+    if exclude_user_id:
+        rows = rows.exclude(user_id=exclude_user_id)
+    rows.update(**{
+        field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()
+    })
+    _invalidate_changed()
+
+
+def set_counters(user_ids, **values):
+    """Set counters outright, e.g. unread_activities=0 after "mark all read"."""
+    from .models import UserCounters
+
+    user_ids = list(user_ids)
+    UserCounters.objects.filter(user_id__in=user_ids).update(**values)
+    _invalidate_changed(user_ids)
+
+
+def adjust_pending_requests(requested_by_id, delta, admins=True):
+    """Move the pending edit request count of the requester and, unless the
+    request is already read, of every admin."""
+    adjust_counters([requested_by_id], pending_requests=delta)
+    if admins:
+        adjust_counters(admin_ids(), pending_requests=delta)
+
+
+# ===== RECOUNTS =====
+
+def count_unread(user):
+    """Count a user's badge items from scratch, as {UserCounters field: count}."""
+    from announcements.views import get_unread_announcements
+    from notifications.models import ActivityNotification, Notification
+    from notifications.utils import unread_broadcasts
+
+    # Pending edit requests: all unread ones for admin, their own for staff
+    if user.role == 'admin':
+        pending = Notification.objects.filter(is_read=False, status='pending')
+    else:
+        pending = Notification.objects.filter(requested_by=user, status='pending')
+
+    return {
+        'pending_requests': pending.count(),
+        'unread_announcements': get_unread_announcements(user).count(),
+        'unread_activities': ActivityNotification.objects.filter(
+            recipient=user, is_read=False
+        ).count() + unread_broadcasts(user).count(),
+    }
+
+
+def recount_counters(user):
+    """Rebuild one user's counters row. Returns the counts."""
+    from .models import UserCounters
+
+    counts = count_unread(user)
+    UserCounters.objects.update_or_create(user=user, defaults=dict(counts, role=user.role))
+    invalidate_user_counters(user.pk)
+    publish_counters([user.pk])
+    return counts
+
+
+def _next_expiry():
+    from announcements.models import Announcement
+
+    next_expiry = Announcement.objects.filter(
+        is_active=True, expires_at__gt=timezone.now()
+    ).aggregate(next_expiry=Min('expires_at'))['next_expiry']
+    return next_expiry.timestamp() if next_expiry else 0
+
+
+def recount_announcement_counters():
+    """Recount unread announcements for every user, one UPDATE per role.
+
+    Run when an announcement is added, changed or removed, and when one
+    expires, since that changes what counts as visible.
+    """
+    from announcements.views import announcement_is_read, get_role_announcements
+    from .models import User, UserCounters
+
+    for role, _ in User.ROLE_CHOICES:
+        unread = get_role_announcements(role).alias(
+            is_read=announcement_is_read(OuterRef(OuterRef('user_id'))),
+        ).filter(is_read=False).order_by().annotate(
+            total=Func('pk', function='COUNT'),
+        ).values('total')
+        UserCounters.objects.filter(role=role).update(unread_announcements=Subquery(unread))
+
+    cache, timeout = _expiry_cache()
+    cache.set(EXPIRY_KEY, _next_expiry(), timeout)
+    invalidate_all_counters()
+    publish_counters()
+
+
+def _recount_if_expired():
+    cache, timeout = _expiry_cache()
+    next_expiry = cache.get(EXPIRY_KEY)
+    if next_expiry is None:
+        cache.set(EXPIRY_KEY, _next_expiry(), timeout)
+    elif next_expiry and time.time() >= next_expiry:
+        recount_announcement_counters()
+
+
+# ===== READS =====
+
+def read_counters(user):
+    """A user's counters from their row, recounted if missing or stale."""
+    from .models import UserCounters
+
+    row = UserCounters.objects.filter(pk=user.pk, role=user.role).values(
+        *COUNTER_FIELDS.values()
+    ).first()
+    if row is None:
+        row = recount_counters(user)
+    return {name: row[field] for name, field in COUNTER_FIELDS.items()}
+
+
+def get_unread_counters(user):
+    """Cached badge counts for a user, as template variables."""
+    _recount_if_expired()
+    cache = _cache()
+    if cache is None:
+        return read_counters(user)
+
+    key = _user_key(_version(cache), user.pk)
+    cached = cache.get(key)
+    # The role decides which counts apply, so a role change rereads
+    if cached is not None and cached[0] == user.role:
+        return cached[1]
+
+    counters = read_counters(user)
+    cache.set(key, (user.role, counters), COUNTERS_TIMEOUT)
+    return counters
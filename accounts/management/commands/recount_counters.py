@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from accounts.counters import recount_counters
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recount the badge counters (requests, activities, announcements) of every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only recount this username')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        total = 0
+        for user in users.iterator():
+            recount_counters(user)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted counters for {total} user(s)'))
@@ -65,6 +65,32 @@ class User(AbstractUser):
         return 'U'
 
 
+class UserCounters(models.Model):
+    """Badge counts for one user, kept up to date as items are added and read.
+
+    Maintained with F() updates by accounts.counters; ``role`` is the role
+    the counts were taken for, so a role change triggers a recount.
+    Repaired with `python manage.py recount_counters`.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    role = models.CharField(max_length=20)
+    pending_requests = models.IntegerField(default=0)
+    unread_activities = models.IntegerField(default=0)
+    unread_announcements = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'user_counters'
+
+    def __str__(self):
+        return f"Counters for {self.user_id}"
+
+
 class LoginAttempt(models.Model):
     username = models.CharField(max_length=150)
     ip_address = models.GenericIPAddressField()
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from announcements.models import Announcement
+from notifications.models import Notification
+from .counters import adjust_pending_requests, recount_announcement_counters
+
+
+# Changes to the badge counters (accounts/counters.py) that are not made by
+# the views adding or reading items.
+
+@receiver([post_save, post_delete], sender=Announcement)
+def recount_announcements(sender, **kwargs):
+    # Adding, editing or removing an announcement changes who can see it
+    recount_announcement_counters()
+
+
+@receiver(post_delete, sender=Notification)
+def drop_pending_request(sender, instance, **kwargs):
+    # Edit requests also go away when their student is deleted
+    if instance.status == 'pending':
+        adjust_pending_requests(instance.requested_by_id, -1, admins=not instance.is_read)
@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_usercounters'),
+        ('announcements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnouncementWatermark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='announcement_watermark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('read_until', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'announcement_watermarks',
+            },
+        ),
+    ]
@@ -26,6 +26,14 @@ class Announcement(models.Model):
         ('staff', 'All Staff (HOD + Teacher + Guardian)'),
     )
 
+    # role -> visibilities whose announcements the role sees
+    ROLE_VISIBILITY = {
+        'admin': tuple(value for value, _ in VISIBILITY_CHOICES),
+        'hod': ('all', 'hod', 'staff'),
+        'teacher': ('all', 'teacher', 'staff'),
+        'guardian': ('all', 'guardian', 'staff'),
+    }
+
     title = models.CharField(max_length=255)
     content = models.TextField()
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='general')
@@ -55,6 +63,13 @@ class Announcement(models.Model):
             models.Index(fields=['visibility']),
             models.Index(fields=['is_pinned']),
             models.Index(fields=['created_at']),
+            # Listing and unread counts: active announcements by visibility,
+            # in display order
+            models.Index(
+                fields=['visibility', 'expires_at', '-is_pinned', '-created_at'],
+                condition=models.Q(is_active=True),
+                name='announcement_active_idx',
+            ),
         ]
 
     def __str__(self):
@@ -108,4 +123,25 @@ class AnnouncementRead(models.Model):
         unique_together = ['announcement', 'user']
 
     def __str__(self):
-        return f"{self.user.full_name} read {self.announcement.title}"
\ No newline at end of file
+        return f"{self.user.full_name} read {self.announcement.title}"
+
+
+class AnnouncementWatermark(models.Model):
+    """Every announcement created up to ``read_until`` counts as read.
+
+    Lets "mark all as read" cover any number of old announcements with one
+    row; AnnouncementRead records the ones opened individually.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='announcement_watermark'
+    )
+    read_until = models.DateTimeField()
+
+    class Meta:
+        db_table = 'announcement_watermarks'
+
+    def __str__(self):
+        return f"{self.user.full_name} read up to {self.read_until}"
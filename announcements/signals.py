@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Announcement
+from .views import invalidate_active_announcement_ids
+
+
+@receiver([post_save, post_delete], sender=Announcement)
+def drop_active_ids(sender, **kwargs):
+    # Creating, editing, toggling or deleting changes who sees what
+    invalidate_active_announcement_ids()
@@ -1,43 +1,107 @@
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Subquery, Value, When
 from django.utils import timezone
 
+from accounts.counters import adjust_counters, set_counters
 from accounts.decorators import role_required, admin_required
 from accounts.utils import log_action
-from .models import Announcement, AnnouncementRead
+from .models import Announcement, AnnouncementRead, AnnouncementWatermark
 from .forms import AnnouncementForm
 
 
+# Above this many unread announcements, "mark all as read" moves the user's
+# AnnouncementWatermark instead of writing a receipt per announcement.
+MARK_ALL_RECEIPT_LIMIT = 100
+
+
 def get_visible_announcements(user):
     """Get announcements visible to a specific user based on their role."""
-    announcements = Announcement.objects.filter(is_active=True)
+    return get_role_announcements(user.role)
+
+
+def get_role_announcements(role):
+    """Active, unexpired announcements visible to users of a role.
 
-    # Filter out expired announcements
-    announcements = announcements.filter(
-        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+    Filters on the columns of announcement_active_idx in index order.
+    """
+    visibilities = Announcement.ROLE_VISIBILITY.get(role, Announcement.ROLE_VISIBILITY['admin'])
+    return Announcement.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+        is_active=True,
+        visibility__in=visibilities,
     )
 
-    # Filter by visibility
-    if user.role == 'admin':
-        # Admin sees all
-        pass
-    elif user.role == 'hod':
-        announcements = announcements.filter(
-            Q(visibility='all') | Q(visibility='hod') | Q(visibility='staff')
-        )
-    elif user.role == 'teacher':
-        announcements = announcements.filter(
-            Q(visibility='all') | Q(visibility='teacher') | Q(visibility='staff')
-        )
-    elif user.role == 'guardian':
-        announcements = announcements.filter(
-            Q(visibility='all') | Q(visibility='guardian') | Q(visibility='staff')
-        )
 
-    return announcements
+# ===== ACTIVE ID CACHE =====
+# The ids of each role's visible announcements are cached so visibility
+# checks usually run no query. The sets live in the shared cache and are
+# dropped whenever an announcement is saved or deleted (from any process,
+# see announcements/signals.py) and reread once one of them expires, so
+# visibility checks trust them.
+
+ACTIVE_IDS_TIMEOUT = 300  # seconds
+
+
+def _active_ids_key(role):
+    return f'announcements:active:{role}'
+
+
+def invalidate_active_announcement_ids():
+    """Drop every role's cached announcement ids."""
+    def invalidate():
+        cache.delete_many([_active_ids_key(role) for role in Announcement.ROLE_VISIBILITY])
+
+    invalidate()
+    # Another request may cache the old ids before this transaction commits
+    if connection.in_atomic_block:
+        transaction.on_commit(invalidate)
+
+
+def active_announcement_ids(role):
+    """Frozenset of the ids of the announcements users of ``role`` can see."""
+    key = _active_ids_key(role)
+    cached = cache.get(key)
+    if cached is not None and (not cached[1] or time.time() < cached[1]):
+        return cached[0]
+
+    ids = set()
+    next_expiry = None
+    for pk, expires_at in get_role_announcements(role).order_by().values_list('pk', 'expires_at'):
+        ids.add(pk)
+        if expires_at and (next_expiry is None or expires_at < next_expiry):
+            next_expiry = expires_at
+
+    ids = frozenset(ids)
+    cache.set(key, (ids, next_expiry.timestamp() if next_expiry else 0), ACTIVE_IDS_TIMEOUT)
+    return ids
+
+
+def announcement_is_read(user):
+    """Expression telling whether ``user`` has read each announcement.
+
+    Read means an AnnouncementRead receipt, or created before the user's
+    watermark. ``user`` may also be an OuterRef to a user id column.
+    """
+    watermark = AnnouncementWatermark.objects.filter(user=user).values('read_until')
+    receipt = AnnouncementRead.objects.filter(announcement=OuterRef('pk'), user=user)
+    return Case(
+        When(Q(created_at__lte=Subquery(watermark)) | Q(Exists(receipt)), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def get_unread_announcements(user):
+    return get_visible_announcements(user).alias(
+        is_read=announcement_is_read(user)
+    ).filter(is_read=False)
 
 
 @login_required
@@ -56,15 +120,11 @@ def announcement_list(request):
             Q(title__icontains=search) | Q(content__icontains=search)
         )
 
-    # Get read status for current user
-    read_ids = set(
-        AnnouncementRead.objects.filter(
-            user=request.user
-        ).values_list('announcement_id', flat=True)
-    )
+    # Read status for current user
+    announcements = announcements.annotate(is_read=announcement_is_read(request.user))
 
     # Count unread
-    unread_count = announcements.exclude(id__in=read_ids).count()
+    unread_count = announcements.filter(is_read=False).count()
 
     paginator = Paginator(announcements, 10)
     page_obj = paginator.get_page(request.GET.get('page'))
@@ -73,7 +133,6 @@ def announcement_list(request):
         'page_obj': page_obj,
         'category_filter': category_filter,
         'search': search,
-        'read_ids': read_ids,
         'unread_count': unread_count,
         'categories': Announcement.CATEGORY_CHOICES,
     })
@@ -86,17 +145,22 @@ def announcement_detail(request, pk):
 
     # Check visibility
     user = request.user
-    if user.role != 'admin':
-        visible = get_visible_announcements(user).filter(pk=pk).exists()
-        if not visible:
-            messages.error(request, 'You do not have permission to view this announcement.')
-            return redirect('announcement_list')
+    visible = announcement.pk in active_announcement_ids(user.role)
+    if not visible and user.role != 'admin':
+        messages.error(request, 'You do not have permission to view this announcement.')
+        return redirect('announcement_list')
 
-    # Mark as read
-    AnnouncementRead.objects.get_or_create(
-        announcement=announcement,
-        user=request.user
-    )
+    # Mark as read; the first read of a visible announcement the watermark
+    # does not cover lowers the badge
+    with transaction.atomic():
+        _, created = AnnouncementRead.objects.get_or_create(
+            announcement=announcement,
+            user=request.user
+        )
+        if created and visible and not AnnouncementWatermark.objects.filter(
+            user=user, read_until__gte=announcement.created_at
+        ).exists():
+            adjust_counters([user.pk], unread_announcements=-1)
 
     return render(request, 'announcements/announcement_detail.html', {
         'announcement': announcement,
@@ -251,16 +315,29 @@ def announcement_toggle_pin(request, pk):
 
 @login_required
 def mark_all_announcements_read(request):
-    """Mark all visible announcements as read."""
+    """Mark all visible announcements as read.
+
+    Unread announcements are found with one anti-join and get receipts in
+    one bulk insert. Past MARK_ALL_RECEIPT_LIMIT (say, a new user with a
+    long backlog) the user's watermark is moved instead.
+    """
     if request.method == 'POST':
-        visible = get_visible_announcements(request.user)
+        unread_ids = list(
+            get_unread_announcements(request.user).values_list('pk', flat=True)[:MARK_ALL_RECEIPT_LIMIT + 1]
+        )
 
-        for announcement in visible:
-            AnnouncementRead.objects.get_or_create(
-                announcement=announcement,
-                user=request.user
-            )
+        with transaction.atomic():
+            if len(unread_ids) > MARK_ALL_RECEIPT_LIMIT:
+                AnnouncementWatermark.objects.update_or_create(
+                    user=request.user, defaults={'read_until': timezone.now()}
+                )
+            else:
+                AnnouncementRead.objects.bulk_create([
+                    AnnouncementRead(announcement_id=pk, user=request.user)
+                    for pk in unread_ids
+                ], ignore_conflicts=True)
+            set_counters([request.user.pk], unread_announcements=0)
 
         messages.success(request, 'All announcements marked as read!')
 
-    return redirect('announcement_list')
\ No newline at end of file
+    return redirect('announcement_list')
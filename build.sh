@@ -10,6 +10,7 @@ python manage.py collectstatic --noinput
 
 echo "===== Running migrations ====="
 python manage.py migrate
+python manage.py createcachetable
 
 echo "===== Creating superuser if needed ====="
 python manage.py shell -c "
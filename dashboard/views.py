@@ -2,6 +2,7 @@
 from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from accounts.decorators import role_required
+from reports.metrics import get_stats
 
 
 @login_required
@@ -20,18 +21,18 @@ def dashboard_redirect(request):
 @role_required('admin')
 def admin_dashboard(request):
     """Admin dashboard with stats."""
-    from accounts.models import User, SecurityLog
-    from students.models import StudentFile, Student
-    from notifications.models import Notification
+    from accounts.models import SecurityLog
     from announcements.models import Announcement
 
+    metrics = get_stats('staff_by_role', 'total_students', 'total_files', 'pending_notifications')
+    staff = metrics['staff_by_role']
     stats = {
-        'total_teachers': User.objects.filter(role='teacher', is_active=True).count(),
-        'total_guardians': User.objects.filter(role='guardian', is_active=True).count(),
-        'total_hods': User.objects.filter(role='hod', is_active=True).count(),
-        'total_students': Student.objects.count(),
-        'total_files': StudentFile.objects.filter(is_active=True).count(),
-        'pending_notifications': Notification.objects.filter(status='pending').count(),
+        'total_teachers': staff.get('teacher', 0),
+        'total_guardians': staff.get('guardian', 0),
+        'total_hods': staff.get('hod', 0),
+        'total_students': metrics['total_students'],
+        'total_files': metrics['total_files'],
+        'pending_notifications': metrics['pending_notifications'],
     }
 
     recent_activity = SecurityLog.objects.select_related('user').all()[:10]
@@ -48,16 +49,13 @@ def admin_dashboard(request):
 @role_required('hod')
 def hod_dashboard(request):
     """HOD dashboard - sees all files."""
-    from students.models import StudentFile, Student
-    from notifications.models import Notification
-
+    metrics = get_stats('total_files', 'total_students', 'requests_by_status', user=request.user)
+    requests = metrics['requests_by_status']
     stats = {
-        'total_files': StudentFile.objects.filter(is_active=True).count(),
-        'total_students': Student.objects.count(),
-        'my_requests': Notification.objects.filter(requested_by=request.user).count(),
-        'pending_requests': Notification.objects.filter(
-            requested_by=request.user, status='pending'
-        ).count(),
+        'total_files': metrics['total_files'],
+        'total_students': metrics['total_students'],
+        'my_requests': sum(requests.values()),
+        'pending_requests': requests.get('pending', 0),
     }
 
     return render(request, 'dashboard/hod_dashboard.html', {
@@ -65,29 +63,23 @@ def hod_dashboard(request):
     })
 
 
+def _assigned_stats(user):
+    """Dashboard figures of a teacher or guardian."""
+    metrics = get_stats('assigned_files', 'assigned_students', 'requests_by_status', user=user)
+    requests = metrics['requests_by_status']
+    return {
+        'assigned_files': metrics['assigned_files'],
+        'total_students': metrics['assigned_students'],
+        'my_requests': sum(requests.values()),
+        'pending_requests': requests.get('pending', 0),
+    }
+
+
 @login_required
 @role_required('teacher')
 def teacher_dashboard(request):
     """Teacher dashboard - sees only assigned files."""
-    from permissions_app.models import FilePermission
-    from students.models import Student
-    from notifications.models import Notification
-
-    assigned_files = FilePermission.objects.filter(
-        user=request.user
-    ).select_related('student_file')
-
-    file_ids = assigned_files.values_list('student_file_id', flat=True)
-    total_students = Student.objects.filter(file_id__in=file_ids).count()
-
-    stats = {
-        'assigned_files': assigned_files.count(),
-        'total_students': total_students,
-        'my_requests': Notification.objects.filter(requested_by=request.user).count(),
-        'pending_requests': Notification.objects.filter(
-            requested_by=request.user, status='pending'
-        ).count(),
-    }
+    stats = _assigned_stats(request.user)
 
     return render(request, 'dashboard/teacher_dashboard.html', {
         'stats': stats,
@@ -98,25 +90,7 @@ def teacher_dashboard(request):
 @role_required('guardian')
 def guardian_dashboard(request):
     """Guardian dashboard - same as teacher."""
-    from permissions_app.models import FilePermission
-    from students.models import Student
-    from notifications.models import Notification
-
-    assigned_files = FilePermission.objects.filter(
-        user=request.user
-    ).select_related('student_file')
-
-    file_ids = assigned_files.values_list('student_file_id', flat=True)
-    total_students = Student.objects.filter(file_id__in=file_ids).count()
-
-    stats = {
-        'assigned_files': assigned_files.count(),
-        'total_students': total_students,
-        'my_requests': Notification.objects.filter(requested_by=request.user).count(),
-        'pending_requests': Notification.objects.filter(
-            requested_by=request.user, status='pending'
-        ).count(),
-    }
+    stats = _assigned_stats(request.user)
 
     return render(request, 'dashboard/guardian_dashboard.html', {
         'stats': stats,
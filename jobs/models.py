@@ -0,0 +1,51 @@
+from django.db import models
+from django.conf import settings
+
+
+class Job(models.Model):
+    """A unit of background work picked up by the run_jobs worker."""
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    payload = models.JSONField(default=dict, blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    input_file = models.FileField(upload_to='job_files/', blank=True, null=True)
+    result_file = models.FileField(upload_to='job_results/', blank=True, null=True)
+    result_url = models.CharField(max_length=255, blank=True, default='')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    def set_progress(self, **counts):
+        """Merge counters into progress and write them straight to the row."""
+        self.progress.update(counts)
+        Job.objects.filter(pk=self.pk).update(progress=self.progress)
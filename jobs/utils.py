@@ -0,0 +1,131 @@
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Only the first few row-level errors are kept on a job.
+MAX_JOB_ERRORS = 50
+
+_handlers = {}
+_cleanups = {}
+
+
+def register(kind):
+    """Decorator registering a handler function for a job kind.
+
+    Handlers live in each app's tasks.py and receive the running Job.
+    Raising an exception marks the job as failed.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def on_abandoned(kind):
+    """Decorator registering a clean-up for jobs of ``kind`` whose worker
+    died mid-run (see recover_stale_jobs). It receives the failed Job.
+    """
+    def decorator(func):
+        _cleanups[kind] = func
+        return func
+    return decorator
+
+
+def stale_cutoff():
+    """Jobs still running since before this are taken to be abandoned."""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'JOBS_STALE_AFTER', 3600))
+
+
+def recover_stale_jobs():
+    """Fail the jobs left running by a worker that crashed or restarted."""
+    recovered = []
+    for job in Job.objects.filter(status='running', started_at__lt=stale_cutoff()):
+        now = timezone.now()
+        errors = (job.errors + ['The worker stopped before the job finished.'])[:MAX_JOB_ERRORS]
+        # Another worker may be recovering it too
+        if not Job.objects.filter(pk=job.pk, status='running').update(
+            status='failed', errors=errors, finished_at=now,
+        ):
+            continue
+        job.status, job.errors, job.finished_at = 'failed', errors, now
+        logger.warning('Job %s was abandoned by its worker', job.pk)
+
+        cleanup = _cleanups.get(job.kind)
+        if cleanup is not None:
+            try:
+                cleanup(job)
+            except Exception:
+                logger.exception('Clean-up of job %s failed', job.pk)
+        recovered.append(job)
+    return recovered
+
+
+def enqueue(kind, payload=None, created_by=None, input_file=None):
+    """Create a pending job. With JOBS_EAGER it is run before returning."""
+    job = Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=created_by,
+        input_file=input_file,
+    )
+    if getattr(settings, 'JOBS_EAGER', False):
+        if claim_job(job):
+            run_job(job)
+    return job
+
+
+def claim_job(job):
+    """Atomically move a pending job to running. Returns False if taken."""
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job.pk, status='pending').update(
+        status='running', started_at=now
+    )
+    if claimed:
+        job.status = 'running'
+        job.started_at = now
+    return bool(claimed)
+
+
+def claim_next_job():
+    """Claim the oldest pending job, or return None if the queue is empty."""
+    recover_stale_jobs()
+    while True:
+        job = Job.objects.filter(status='pending').order_by('created_at', 'pk').first()
+        if job is None:
+            return None
+        if claim_job(job):
+            return job
+
+
+def run_job(job):
+    """Run a claimed job through its handler and record the outcome."""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind "{job.kind}"')
+        handler(job)
+    except Exception as e:
+        logger.exception('Job %s failed', job.pk)
+        job.status = 'failed'
+        job.errors = (job.errors + [str(e)])[:MAX_JOB_ERRORS]
+    else:
+        job.status = 'done'
+
+    job.finished_at = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, status='running').update(
+        status=job.status, errors=job.errors, result_file=job.result_file,
+        result_url=job.result_url, finished_at=job.finished_at,
+    )
+    if not finished:
+        # recover_stale_jobs() took it for abandoned meanwhile and ran its
+        # clean-up; the job stays failed
+        logger.warning('Job %s finished after it was given up on', job.pk)
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,40 @@
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, JsonResponse, Http404
+from django.shortcuts import get_object_or_404
+
+from .models import Job
+
+
+def _get_job(request, pk):
+    """A job visible to the user: admins see every job, others their own."""
+    job = get_object_or_404(Job, pk=pk)
+    if request.user.role != 'admin' and job.created_by_id != request.user.pk:
+        raise Http404
+    return job
+
+
+@login_required
+def job_status(request, pk):
+    """Progress of a background job as JSON, for polling."""
+    job = _get_job(request, pk)
+
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'finished': job.is_finished,
+        'progress': job.progress,
+        'errors': job.errors[:5],
+        'error_count': len(job.errors),
+        'result_url': job.result_url,
+    })
+
+
+@login_required
+def job_result(request, pk):
+    """Download the file produced by a finished job."""
+    job = _get_job(request, pk)
+    if job.status != 'done' or not job.result_file:
+        raise Http404
+    return FileResponse(job.result_file.open('rb'), as_attachment=True,
+                        filename=job.result_file.name.rsplit('/', 1)[-1])
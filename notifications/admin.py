@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, ActivityNotification
+from .models import Notification, ActivityNotification, BroadcastNotification
 
 
 @admin.register(Notification)
@@ -13,4 +13,11 @@ class NotificationAdmin(admin.ModelAdmin):
 class ActivityNotificationAdmin(admin.ModelAdmin):
     list_display = ('recipient', 'notification_type', 'title', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read', 'created_at')
-    search_fields = ('title', 'message', 'recipient__full_name')
\ No newline at end of file
+    search_fields = ('title', 'message', 'recipient__full_name')
+
+
+@admin.register(BroadcastNotification)
+class BroadcastNotificationAdmin(admin.ModelAdmin):
+    list_display = ('audience', 'notification_type', 'title', 'created_at')
+    list_filter = ('audience', 'notification_type', 'created_at')
+    search_fields = ('title', 'message')
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+# Live updates for the event stream (notifications.views.event_stream).
+# Writers publish small messages on channels; each open stream listens on
+# its user's channel, its role's channel and ALL_CHANNEL. Messages are
+# {'event': name, 'data': payload, 'exclude': user id or None}:
+#   counters - the badge counts of the channel's users changed
+#   activity - a new activity notification ({'title', 'link', 'type'})
+
+ALL_CHANNEL = 'all'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def role_channel(role):
+    return f'role:{role}'
+
+
+class _LocalSubscription:
+    def __init__(self, queue):
+        self._queue = queue
+
+    async def get(self, timeout):
+        """Next message, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process pub/sub: messages reach streams served by this process.
+
+    Enough for a single server process and for tests. Publishing is safe
+    from any thread; each subscriber's queue is fed on its own event loop.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The stream's loop closed under us
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(entry)
+        try:
+            yield _LocalSubscription(entry[1])
+        finally:
+            with self._lock:
+                for channel in channels:
+                    self._subscribers[channel].discard(entry)
+                    if not self._subscribers[channel]:
+                        del self._subscribers[channel]
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+
+class RedisBroker:
+    """Pub/sub through Redis (or any server speaking its protocol), so
+    streams see messages published by every process."""
+
+    PREFIX = 'sms:events:'
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(self.PREFIX + channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[self.PREFIX + channel for channel in channels])
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+    """The broker for this process: Redis with EVENTS_REDIS_URL, else local."""
+    global _broker
+    if _broker is None:
+        url = getattr(settings, 'EVENTS_REDIS_URL', '')
+        _broker = RedisBroker(url) if url else LocalBroker()
+    return _broker
+
+
+def publish(channels, event, data=None, exclude_user_id=None):
+    """Send an event to the streams listening on ``channels``.
+
+    Inside a transaction the event goes out once it commits, so streams
+    never read state older than the event. A broker failure is logged and
+    never breaks the write that triggered it.
+    """
+    message = {'event': event, 'data': data or {}, 'exclude': exclude_user_id}
+
+    def send():
+        broker = get_broker()
+        for channel in channels:
+            try:
+                broker.publish(channel, message)
+            except Exception:
+                logger.exception('Could not publish %s event on %s', event, channel)
+
+    if connection.in_atomic_block:
+        transaction.on_commit(send)
+    else:
+        send()
+
+
+def publish_counters(user_ids=None):
+    """Tell the users' streams (None: everyone's) to resend their badge counts."""
+    if user_ids is None:
+        publish([ALL_CHANNEL], 'counters')
+    else:
+        publish([user_channel(user_id) for user_id in user_ids], 'counters')
+
+
+def publish_activity(channels, title, link='', notification_type='general', exclude_user_id=None):
+    publish(channels, 'activity', {
+        'title': title, 'link': link, 'type': notification_type,
+    }, exclude_user_id)
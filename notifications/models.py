@@ -64,6 +64,31 @@ class Notification(models.Model):
         return f"{self.requested_by.full_name} → {self.student.full_name} ({self.status})"
 
 
+TYPE_EMOJIS = {
+    'file_assigned': '📁',
+    'file_uploaded': '📤',
+    'announcement': '📢',
+    'permission_granted': '✅',
+    'permission_revoked': '❌',
+    'edit_resolved': '✅',
+    'staff_created': '👤',
+    'password_changed': '🔑',
+    'general': '📋',
+}
+
+TYPE_COLORS = {
+    'file_assigned': '#4f46e5',
+    'file_uploaded': '#06b6d4',
+    'announcement': '#d97706',
+    'permission_granted': '#16a34a',
+    'permission_revoked': '#dc2626',
+    'edit_resolved': '#16a34a',
+    'staff_created': '#8b5cf6',
+    'password_changed': '#f59e0b',
+    'general': '#64748b',
+}
+
+
 class ActivityNotification(models.Model):
     """In-app notifications for various system events."""
 
@@ -111,30 +136,110 @@ class ActivityNotification(models.Model):
 
     @property
     def type_emoji(self):
-        emojis = {
-            'file_assigned': '📁',
-            'file_uploaded': '📤',
-            'announcement': '📢',
-            'permission_granted': '✅',
-            'permission_revoked': '❌',
-            'edit_resolved': '✅',
-            'staff_created': '👤',
-            'password_changed': '🔑',
-            'general': '📋',
-        }
-        return emojis.get(self.notification_type, '📋')
+        return TYPE_EMOJIS.get(self.notification_type, '📋')
+
+    @property
+    def type_color(self):
+        return TYPE_COLORS.get(self.notification_type, '#64748b')
+
+
+class BroadcastNotification(models.Model):
+    """An activity notification sent once to a whole audience.
+
+    Instead of a row per recipient, read state is kept per user: everything
+    up to the user's BroadcastWatermark is read, and broadcasts opened
+    since then have a BroadcastRead receipt.
+    """
+
+    AUDIENCE_CHOICES = (
+        ('staff', 'All Staff (HOD + Teacher + Guardian)'),
+        ('admin', 'Admins'),
+        ('hod', 'HODs'),
+        ('teacher', 'Teachers'),
+        ('guardian', 'Teacher Guardians'),
+    )
+
+    # audience -> user roles it reaches
+    AUDIENCE_ROLES = {
+        'staff': ('hod', 'teacher', 'guardian'),
+        'admin': ('admin',),
+        'hod': ('hod',),
+        'teacher': ('teacher',),
+        'guardian': ('guardian',),
+    }
+
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES)
+    exclude_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+'
+    )
+    notification_type = models.CharField(
+        max_length=30, choices=ActivityNotification.TYPE_CHOICES, default='general'
+    )
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    link = models.CharField(max_length=255, blank=True, default='')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='created_broadcasts'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'broadcast_notifications'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['audience', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_audience_display()}: {self.title}"
+
+    @classmethod
+    def audiences_for(cls, role):
+        return [audience for audience, roles in cls.AUDIENCE_ROLES.items() if role in roles]
+
+    @property
+    def type_emoji(self):
+        return TYPE_EMOJIS.get(self.notification_type, '📋')
 
     @property
     def type_color(self):
-        colors = {
-            'file_assigned': '#4f46e5',
-            'file_uploaded': '#06b6d4',
-            'announcement': '#d97706',
-            'permission_granted': '#16a34a',
-            'permission_revoked': '#dc2626',
-            'edit_resolved': '#16a34a',
-            'staff_created': '#8b5cf6',
-            'password_changed': '#f59e0b',
-            'general': '#64748b',
-        }
-        return colors.get(self.notification_type, '#64748b')
\ No newline at end of file
+        return TYPE_COLORS.get(self.notification_type, '#64748b')
+
+
+class BroadcastRead(models.Model):
+    """A broadcast a user opened after their watermark."""
+    broadcast = models.ForeignKey(
+        BroadcastNotification,
+        on_delete=models.CASCADE,
+        related_name='reads'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='broadcast_reads'
+    )
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'broadcast_reads'
+        unique_together = ['broadcast', 'user']
+
+
+class BroadcastWatermark(models.Model):
+    """Every broadcast created up to ``read_until`` counts as read."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='broadcast_watermark'
+    )
+    read_until = models.DateTimeField()
+
+    class Meta:
+        db_table = 'broadcast_watermarks'
@@ -11,5 +11,7 @@ urlpatterns = [
     # Activity Feed
     path('activity/', views.activity_feed, name='activity_feed'),
     path('activity/<int:pk>/read/', views.mark_activity_read, name='mark_activity_read'),
+    path('activity/broadcast/<int:pk>/read/', views.mark_broadcast_read, name='mark_broadcast_read'),
     path('activity/mark-all-read/', views.mark_all_activities_read, name='mark_all_activities_read'),
+    path('activity/stream/', views.event_stream, name='event_stream'),
 ]
\ No newline at end of file
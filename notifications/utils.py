@@ -1,41 +1,181 @@
-from .models import ActivityNotification
-from accounts.models import User
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.urls import reverse
+
+from .models import (
+    ActivityNotification, BroadcastNotification, BroadcastRead, BroadcastWatermark,
+    TYPE_COLORS, TYPE_EMOJIS,
+)
+from .events import publish_activity, role_channel, user_channel
+from accounts.counters import adjust_counters, adjust_role_counters
 
 
 def send_activity_notification(recipient, notification_type, title, message, link='', created_by=None):
     """Send an activity notification to a specific user."""
-    ActivityNotification.objects.create(
-        recipient=recipient,
-        notification_type=notification_type,
-        title=title,
-        message=message,
-        link=link,
-        created_by=created_by,
-    )
+    with transaction.atomic():
+        ActivityNotification.objects.create(
+            recipient=recipient,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            link=link,
+            created_by=created_by,
+        )
+        adjust_counters([recipient.pk], unread_activities=1)
+        publish_activity([user_channel(recipient.pk)], title, link, notification_type)
 
 
-def send_to_all_staff(notification_type, title, message, link='', created_by=None, exclude_user=None):
-    """Send notification to all active staff (except admin and excluded user)."""
-    staff = User.objects.filter(
-        is_active=True,
-        role__in=['hod', 'teacher', 'guardian']
-    )
-    if exclude_user:
-        staff = staff.exclude(pk=exclude_user.pk)
+def send_activity_notifications(recipient, notifications, created_by=None):
+    """Send several activity notifications to one user with one bulk_create.
+
+    ``notifications`` holds (notification_type, title, message, link)
+    tuples. Live streams get one toast per item, or a single summary when
+    there are more than a few.
+    """
+    if not notifications:
+        return
+    with transaction.atomic():
+        ActivityNotification.objects.bulk_create([
+            ActivityNotification(
+                recipient=recipient,
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                link=link,
+                created_by=created_by,
+            )
+            for notification_type, title, message, link in notifications
+        ])
+        adjust_counters([recipient.pk], unread_activities=len(notifications))
 
-    for user in staff:
-        send_activity_notification(user, notification_type, title, message, link, created_by)
+        channels = [user_channel(recipient.pk)]
+        if len(notifications) > 3:
+            publish_activity(channels, f'{len(notifications)} new notifications', reverse('activity_feed'))
+        else:
+            for notification_type, title, _, link in notifications:
+                publish_activity(channels, title, link, notification_type)
+
+
+# ===== BROADCASTS =====
+
+def broadcast(audience, notification_type, title, message, link='', created_by=None, exclude_user=None):
+    """Send an activity notification to a whole audience (see BroadcastNotification).
+
+    Writes a single row and bumps the audience's unread counters with one
+    UPDATE, however many users it reaches.
+    """
+    with transaction.atomic():
+        item = BroadcastNotification.objects.create(
+            audience=audience,
+            exclude_user=exclude_user,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            link=link,
+            created_by=created_by,
+        )
+        roles = BroadcastNotification.AUDIENCE_ROLES[audience]
+        exclude_user_id = exclude_user.pk if exclude_user else None
+        adjust_role_counters(roles, exclude_user_id=exclude_user_id, unread_activities=1)
+        publish_activity(
+            [role_channel(role) for role in roles], title, link, notification_type, exclude_user_id,
+        )
+    return item
+
+
+def send_to_all_staff(notification_type, title, message, link='', created_by=None, exclude_user=None):
+    """Send notification to all staff (except admin and excluded user)."""
+    return broadcast('staff', notification_type, title, message, link, created_by, exclude_user)
 
 
 def send_to_admins(notification_type, title, message, link='', created_by=None):
     """Send notification to all admins."""
-    admins = User.objects.filter(is_active=True, role='admin')
-    for admin in admins:
-        send_activity_notification(admin, notification_type, title, message, link, created_by)
+    return broadcast('admin', notification_type, title, message, link, created_by)
 
 
 def send_to_role(role, notification_type, title, message, link='', created_by=None):
     """Send notification to all users of a specific role."""
-    users = User.objects.filter(is_active=True, role=role)
-    for user in users:
-        send_activity_notification(user, notification_type, title, message, link, created_by)
\ No newline at end of file
+    return broadcast(role, notification_type, title, message, link, created_by)
+
+
+def broadcasts_for(user):
+    """Broadcasts a user receives: their role's, sent since they joined."""
+    return BroadcastNotification.objects.filter(
+        audience__in=BroadcastNotification.audiences_for(user.role),
+        created_at__gte=user.created_at,
+    ).exclude(exclude_user=user)
+
+
+def _broadcast_is_read(user):
+    """Expression telling whether ``user`` has read each broadcast."""
+    watermark = BroadcastWatermark.objects.filter(user=user).values('read_until')
+    receipt = BroadcastRead.objects.filter(broadcast=OuterRef('pk'), user=user)
+    return Case(
+        When(Q(created_at__lte=Subquery(watermark)) | Q(Exists(receipt)), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def unread_broadcasts(user):
+    return broadcasts_for(user).annotate(read=_broadcast_is_read(user)).filter(read=False)
+
+
+# ===== ACTIVITY FEED =====
+
+FEED_COLUMNS = (
+    'pk', 'notification_type', 'title', 'message', 'link',
+    'created_by_id', 'created_at', 'kind', 'read',
+)
+
+
+def activity_stream(user, notification_type=''):
+    """A user's personal and broadcast notifications, newest first.
+
+    Both streams are merged in the database with UNION ALL, so the result
+    can be paginated like any queryset. Rows are dicts of FEED_COLUMNS.
+    """
+    personal = ActivityNotification.objects.filter(recipient=user).annotate(
+        kind=Value('activity'), read=F('is_read'),
+    )
+    broadcasts = broadcasts_for(user).annotate(
+        kind=Value('broadcast'), read=_broadcast_is_read(user),
+    )
+    if notification_type:
+        personal = personal.filter(notification_type=notification_type)
+        broadcasts = broadcasts.filter(notification_type=notification_type)
+
+    return personal.order_by().values(*FEED_COLUMNS).union(
+        broadcasts.order_by().values(*FEED_COLUMNS), all=True
+    ).order_by('-created_at')
+
+
+class FeedItem:
+    """One activity feed row, personal or broadcast."""
+
+    def __init__(self, row, created_by=None):
+        self.__dict__.update(row)
+        self.is_read = bool(row['read'])
+        self.created_by = created_by
+
+    @property
+    def type_emoji(self):
+        return TYPE_EMOJIS.get(self.notification_type, '📋')
+
+    @property
+    def type_color(self):
+        return TYPE_COLORS.get(self.notification_type, '#64748b')
+
+    @property
+    def read_url(self):
+        view = 'mark_broadcast_read' if self.kind == 'broadcast' else 'mark_activity_read'
+        return reverse(view, args=[self.pk])
+
+
+def feed_items(rows):
+    """Wrap a page of activity_stream() rows, loading senders in one query."""
+    from accounts.models import User
+
+    rows = list(rows)
+    senders = User.objects.in_bulk({row['created_by_id'] for row in rows if row['created_by_id']})
+    return [FeedItem(row, senders.get(row['created_by_id'])) for row in rows]
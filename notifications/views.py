@@ -1,14 +1,27 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.http import Http404, StreamingHttpResponse
+from django.db import transaction
 from django.utils import timezone
 
+from accounts.counters import (
+    adjust_counters, adjust_pending_requests, admin_ids, get_unread_counters, set_counters,
+)
 from accounts.decorators import admin_required, role_required
 from accounts.utils import log_action
+from permissions_app.access import can_access
 from students.models import Student, StudentFile
-from .models import Notification, ActivityNotification
+from .models import Notification, ActivityNotification, BroadcastRead, BroadcastWatermark
 from .forms import MarkEditForm
+from .events import ALL_CHANNEL, get_broker, role_channel, user_channel
+from .utils import activity_stream, broadcasts_for, feed_items, unread_broadcasts
 
 
 @login_required
@@ -73,13 +86,9 @@ def create_mark_edit(request):
 
             student = get_object_or_404(Student, pk=student_id)
 
-            if request.user.role in ('teacher', 'guardian'):
-                from permissions_app.models import FilePermission
-                if not FilePermission.objects.filter(
-                    user=request.user, student_file=student.file
-                ).exists():
-                    messages.error(request, 'You do not have permission.')
-                    return redirect('file_list')
+            if not can_access(request.user, student.file_id):
+                messages.error(request, 'You do not have permission.')
+                return redirect('file_list')
 
             existing = Notification.objects.filter(
                 student=student,
@@ -91,13 +100,15 @@ def create_mark_edit(request):
                 messages.warning(request, 'You already have a pending edit request for this student.')
                 return redirect('student_list', file_id=student.file_id)
 
-            Notification.objects.create(
-                student=student,
-                student_file=student.file,
-                requested_by=request.user,
-                field_to_edit=field_to_edit,
-                remark=remark,
-            )
+            with transaction.atomic():
+                Notification.objects.create(
+                    student=student,
+                    student_file=student.file,
+                    requested_by=request.user,
+                    field_to_edit=field_to_edit,
+                    remark=remark,
+                )
+                adjust_pending_requests(request.user.pk, 1)
 
             student.status = 'marked'
             student.save()
@@ -130,12 +141,16 @@ def resolve_notification(request, pk):
     notification = get_object_or_404(Notification, pk=pk)
 
     if request.method == 'POST':
+        was_pending, was_unread = notification.status == 'pending', not notification.is_read
         notification.status = 'resolved'
         notification.is_read = True
         notification.resolved_by = request.user
         notification.resolved_at = timezone.now()
         notification.resolution_note = request.POST.get('resolution_note', '')
-        notification.save()
+        with transaction.atomic():
+            notification.save()
+            if was_pending:
+                adjust_pending_requests(notification.requested_by_id, -1, admins=was_unread)
 
         student = notification.student
         other_pending = Notification.objects.filter(
@@ -171,9 +186,13 @@ def dismiss_notification(request, pk):
     notification = get_object_or_404(Notification, pk=pk)
 
     if request.method == 'POST':
+        was_pending, was_unread = notification.status == 'pending', not notification.is_read
         notification.status = 'dismissed'
         notification.is_read = True
-        notification.save()
+        with transaction.atomic():
+            notification.save()
+            if was_pending:
+                adjust_pending_requests(notification.requested_by_id, -1, admins=was_unread)
 
         student = notification.student
         other_pending = Notification.objects.filter(
@@ -196,7 +215,9 @@ def dismiss_notification(request, pk):
 def mark_all_read(request):
     """Mark all notifications as read."""
     if request.method == 'POST':
-        Notification.objects.filter(is_read=False).update(is_read=True)
+        with transaction.atomic():
+            Notification.objects.filter(is_read=False).update(is_read=True)
+            set_counters(admin_ids(), pending_requests=0)
         messages.success(request, 'All notifications marked as read.')
 
     return redirect('notification_list')
@@ -206,20 +227,19 @@ def mark_all_read(request):
 
 @login_required
 def activity_feed(request):
-    """Show activity feed for current user."""
+    """Show activity feed for current user (personal and broadcast notifications)."""
     type_filter = request.GET.get('type', '')
 
-    activities = ActivityNotification.objects.filter(
-        recipient=request.user
-    ).select_related('created_by')
+    paginator = Paginator(activity_stream(request.user, type_filter), 15)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = feed_items(page_obj.object_list)
 
+    unread = ActivityNotification.objects.filter(recipient=request.user, is_read=False)
+    broadcasts = unread_broadcasts(request.user)
     if type_filter:
-        activities = activities.filter(notification_type=type_filter)
-
-    unread_count = activities.filter(is_read=False).count()
-
-    paginator = Paginator(activities, 15)
-    page_obj = paginator.get_page(request.GET.get('page'))
+        unread = unread.filter(notification_type=type_filter)
+        broadcasts = broadcasts.filter(notification_type=type_filter)
+    unread_count = unread.count() + broadcasts.count()
 
     type_choices = ActivityNotification.TYPE_CHOICES
 
@@ -235,21 +255,96 @@ def activity_feed(request):
 def mark_activity_read(request, pk):
     """Mark single activity as read."""
     activity = get_object_or_404(ActivityNotification, pk=pk, recipient=request.user)
-    activity.is_read = True
-    activity.save()
+    if not activity.is_read:
+        activity.is_read = True
+        with transaction.atomic():
+            activity.save()
+            adjust_counters([request.user.pk], unread_activities=-1)
 
     if activity.link:
         return redirect(activity.link)
     return redirect('activity_feed')
 
 
+@login_required
+def mark_broadcast_read(request, pk):
+    """Mark a broadcast notification as read for the current user."""
+    broadcast = get_object_or_404(broadcasts_for(request.user), pk=pk)
+    if unread_broadcasts(request.user).filter(pk=pk).exists():
+        with transaction.atomic():
+            _, created = BroadcastRead.objects.get_or_create(broadcast=broadcast, user=request.user)
+            if created:
+                adjust_counters([request.user.pk], unread_activities=-1)
+
+    if broadcast.link:
+        return redirect(broadcast.link)
+    return redirect('activity_feed')
+
+
 @login_required
 def mark_all_activities_read(request):
     """Mark all activities as read."""
     if request.method == 'POST':
-        ActivityNotification.objects.filter(
-            recipient=request.user, is_read=False
-        ).update(is_read=True)
+        with transaction.atomic():
+            ActivityNotification.objects.filter(
+                recipient=request.user, is_read=False
+            ).update(is_read=True)
+            # Broadcasts: move the watermark; receipts below it are not needed
+            BroadcastWatermark.objects.update_or_create(
+                user=request.user, defaults={'read_until': timezone.now()}
+            )
+            BroadcastRead.objects.filter(user=request.user).delete()
+            set_counters([request.user.pk], unread_activities=0)
         messages.success(request, 'All notifications marked as read!')
 
-    return redirect('activity_feed')
\ No newline at end of file
+    return redirect('activity_feed')
+
+
+# ===== LIVE UPDATES =====
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _event_messages(user):
+    """Server-sent events for one user's stream (see notifications/events.py).
+
+    Starts with the full badge counts, then sends the counts that changed
+    after each 'counters' event and forwards new activity. Ends after
+    EVENT_STREAM_TIMEOUT seconds; the browser then reconnects.
+    """
+    channels = [user_channel(user.pk), role_channel(user.role), ALL_CHANNEL]
+    read_counters = sync_to_async(get_unread_counters)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENT_STREAM_TIMEOUT
+
+    async with get_broker().subscribe(channels) as subscription:
+        counters = await read_counters(user)
+        yield f'retry: 5000\n{_sse("counters", counters)}'
+
+        while (remaining := deadline - loop.time()) > 0:
+            message = await subscription.get(min(settings.EVENT_STREAM_HEARTBEAT, remaining))
+            if message is None:
+                yield ': keep-alive\n\n'
+            elif message['exclude'] == user.pk:
+                continue
+            elif message['event'] == 'counters':
+                current = await read_counters(user)
+                changed = {name: count for name, count in current.items() if counters.get(name) != count}
+                counters = current
+                if changed:
+                    yield _sse('counters', changed)
+            else:
+                yield _sse(message['event'], message['data'])
+
+
+@login_required
+async def event_stream(request):
+    """Stream badge count changes and new activity to the logged-in user."""
+    if not settings.LIVE_UPDATES:
+        raise Http404
+    user = await request.auser()
+    response = StreamingHttpResponse(_event_messages(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,39 @@
+from .models import FilePermission
+
+
+# Which student files a user may open. Admins and HODs can open every file;
+# teachers and guardians only the files granted to them (FilePermission).
+# Each user's granted ids are read once per request and memoized on the
+# user object. They are deliberately not cached across requests: a revoked
+# grant must take effect at once, in every worker.
+
+FULL_ACCESS_ROLES = ('admin', 'hod')
+
+
+def accessible_file_ids(user):
+    """Ids of the files ``user`` was granted, or None if they can open all files."""
+    if user.role in FULL_ACCESS_ROLES:
+        return None
+
+    if not hasattr(user, '_file_access'):
+        user._file_access = frozenset(
+            FilePermission.objects.filter(user=user).values_list('student_file_id', flat=True)
+        )
+    return user._file_access
+
+
+def can_access(user, file_id):
+    """Whether ``user`` may open the student file ``file_id``."""
+    file_ids = accessible_file_ids(user)
+    return file_ids is None or file_id in file_ids
+
+
+def accessible_files(user):
+    """Active student files ``user`` can open."""
+    from students.models import StudentFile
+
+    files = StudentFile.objects.filter(is_active=True)
+    file_ids = accessible_file_ids(user)
+    if file_ids is not None:
+        files = files.filter(id__in=file_ids)
+    return files
@@ -4,5 +4,6 @@ from . import views
 
 urlpatterns = [
     path('permissions/', views.permission_list, name='permission_list'),
+    path('permissions/<int:user_id>/files/', views.permission_files, name='permission_files'),
     path('permissions/save/<int:user_id>/', views.permission_save, name='permission_save'),
 ]
\ No newline at end of file
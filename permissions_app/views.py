@@ -1,10 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.http import urlencode
 
 from accounts.decorators import admin_required
 from accounts.models import User
 from accounts.utils import log_action
+from reports.metrics import invalidate_stats
 from students.models import StudentFile
 from .models import FilePermission
 
@@ -12,34 +19,85 @@ from .models import FilePermission
 @login_required
 @admin_required
 def permission_list(request):
-    """Show permission management page."""
+    """Show permission management page.
+
+    Staff are paginated; the grants of the whole page come from one query.
+    Each staff member's file checkboxes are loaded when their row is
+    opened (permission_files), so the page stays small with many files.
+    """
     search = request.GET.get('search', '')
+    department = request.GET.get('department', '')
+    year = request.GET.get('year', '')
 
     staff = User.objects.filter(
         role__in=['teacher', 'guardian'],
         is_active=True
     ).order_by('role', 'full_name')
+    departments = staff.exclude(department='').order_by('department').values_list(
+        'department', flat=True
+    ).distinct()
 
     if search:
-        from django.db.models import Q
         staff = staff.filter(
             Q(full_name__icontains=search) |
             Q(email__icontains=search)
         )
+    if department:
+        staff = staff.filter(department=department)
+
+    files = StudentFile.objects.filter(is_active=True)
+    years = files.order_by('year').values_list('year', flat=True).distinct()
+    if year:
+        files = files.filter(year=year)
+
+    paginator = Paginator(staff, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # {user id: set of granted file ids} for the page, in one query
+    permissions = {s.pk: set() for s in page_obj}
+    for user_id, file_id in FilePermission.objects.filter(
+        user_id__in=permissions, student_file__in=files
+    ).values_list('user_id', 'student_file_id'):
+        permissions[user_id].add(file_id)
+    for s in page_obj:
+        s.granted_count = len(permissions[s.pk])
+
+    # Filters kept by the pagination links
+    filter_query = urlencode({
+        name: value for name, value in
+        (('search', search), ('department', department), ('year', year)) if value
+    })
 
-    files = StudentFile.objects.filter(is_active=True).order_by('file_name')
+    return render(request, 'permissions/manage_permissions.html', {
+        'page_obj': page_obj,
+        'filter_query': filter_query,
+        'file_count': files.count(),
+        'search': search,
+        'department': department,
+        'departments': departments,
+        'year': year,
+        'years': years,
+    })
 
-    permissions = {}
-    for s in staff:
-        permissions[s.id] = set(
-            FilePermission.objects.filter(user=s).values_list('student_file_id', flat=True)
-        )
 
-    return render(request, 'permissions/manage_permissions.html', {
-        'staff': staff,
+@login_required
+@admin_required
+def permission_files(request, user_id):
+    """File checkboxes for one staff member (loaded into permission_list)."""
+    user = get_object_or_404(User, pk=user_id, is_active=True)
+    year = request.GET.get('year', '')
+
+    files = StudentFile.objects.filter(is_active=True).order_by('file_name')
+    if year:
+        files = files.filter(year=year)
+
+    return render(request, 'permissions/_permission_files.html', {
+        'staff_user': user,
         'files': files,
-        'permissions': permissions,
-        'search': search,
+        'granted': set(
+            FilePermission.objects.filter(user=user).values_list('student_file_id', flat=True)
+        ),
+        'year': year,
     })
 
 
@@ -50,65 +108,74 @@ def permission_save(request, user_id):
     if request.method == 'POST':
         user = get_object_or_404(User, pk=user_id, is_active=True)
 
-        # Get old permissions for comparison
-        old_file_ids = set(
-            FilePermission.objects.filter(user=user).values_list('student_file_id', flat=True)
-        )
+        # A form filtered by year only covers that year's files
+        year = request.POST.get('year', '')
+        permissions = FilePermission.objects.filter(user=user)
+        if year:
+            permissions = permissions.filter(student_file__year=year)
 
-        selected_files = request.POST.getlist('files')
-        selected_file_ids = set(int(f) for f in selected_files if f.isdigit())
+        # Saves for one user run one at a time: the diff is taken from the
+        # rows as they are inside the transaction
+        with transaction.atomic():
+            User.objects.select_for_update().filter(pk=user.pk).first()
 
-        # Find newly granted and revoked
-        newly_granted = selected_file_ids - old_file_ids
-        revoked = old_file_ids - selected_file_ids
+            # Get old permissions for comparison
+            old_file_ids = set(permissions.values_list('student_file_id', flat=True))
 
-        # Delete all existing and create new
-        FilePermission.objects.filter(user=user).delete()
+            selected_files = request.POST.getlist('files')
+            selected_file_ids = set(int(f) for f in selected_files if f.isdigit())
 
-        for file_id in selected_files:
-            try:
-                student_file = StudentFile.objects.get(pk=file_id, is_active=True)
-                FilePermission.objects.create(
-                    user=user,
-                    student_file=student_file,
-                    granted_by=request.user,
-                )
-            except StudentFile.DoesNotExist:
-                continue
+            # Every file involved, in one query; only active ones can be granted
+            files = StudentFile.objects.in_bulk(selected_file_ids | old_file_ids)
+            granted_ids = {
+                pk for pk in selected_file_ids
+                if pk in files and files[pk].is_active and (not year or files[pk].year == year)
+            }
 
-        # Send activity notifications
-        from notifications.utils import send_activity_notification
+            # Find newly granted and revoked
+            newly_granted = granted_ids - old_file_ids
+            revoked = old_file_ids - selected_file_ids
 
-        for file_id in newly_granted:
-            try:
-                sf = StudentFile.objects.get(pk=file_id)
-                send_activity_notification(
-                    user,
+            notifications = [
+                (
                     'file_assigned',
-                    f'New File Assigned: {sf.file_name}',
-                    f'You have been granted access to "{sf.file_name}" ({sf.class_name} Div {sf.division} {sf.year}). You can now view its students.',
-                    f'/files/{sf.pk}/',
-                    created_by=request.user
+                    f'New File Assigned: {files[pk].file_name}',
+                    f'You have been granted access to "{files[pk].file_name}" ({files[pk].class_name} Div {files[pk].division} {files[pk].year}). You can now view its students.',
+                    f'/files/{pk}/',
                 )
-            except StudentFile.DoesNotExist:
-                pass
-
-        for file_id in revoked:
-            try:
-                sf = StudentFile.objects.get(pk=file_id)
-                send_activity_notification(
-                    user,
+                for pk in sorted(newly_granted)
+            ] + [
+                (
                     'permission_revoked',
-                    f'File Access Removed: {sf.file_name}',
-                    f'Your access to "{sf.file_name}" has been revoked by admin.',
+                    f'File Access Removed: {files[pk].file_name}',
+                    f'Your access to "{files[pk].file_name}" has been revoked by admin.',
                     '',
-                    created_by=request.user
                 )
-            except StudentFile.DoesNotExist:
-                pass
+                for pk in sorted(revoked) if pk in files
+            ]
+
+            # Only touch the rows that changed
+            FilePermission.objects.filter(
+                user=user, student_file_id__in=old_file_ids - granted_ids
+            ).delete()
+            FilePermission.objects.bulk_create([
+                FilePermission(user=user, student_file_id=pk, granted_by=request.user)
+                for pk in newly_granted
+            ], ignore_conflicts=True)  # a double submit may have added them
+
+            # Send activity notifications
+            from notifications.utils import send_activity_notifications
+            send_activity_notifications(user, notifications, created_by=request.user)
+
+        invalidate_stats('permissions', [user.pk])
 
         log_action(request.user, 'permission_change', request,
-                   f'Updated permissions for {user.full_name}: {len(selected_files)} files')
+                   f'Updated permissions for {user.full_name}: {len(granted_ids)} files')
         messages.success(request, f'Permissions updated for {user.full_name}!')
 
+        # Back to the same page and filters
+        query = QueryDict(request.POST.get('list_query', '')).urlencode()
+        if query:
+            return redirect(f"{reverse('permission_list')}?{query}")
+
     return redirect('permission_list')
\ No newline at end of file
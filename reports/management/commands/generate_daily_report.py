@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports.snapshots import refresh_report_snapshots
+from reports.summary import build_summary_report
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the report rollups and store a summary PDF (schedule once a day, e.g. from cron)'
+
+    def handle(self, *args, **options):
+        snapshot, stats = refresh_report_snapshots()
+        report = build_summary_report(stats)
+        self.stdout.write(self.style.SUCCESS(
+            f'Summary report of {timezone.localtime(report.taken_at):%Y-%m-%d %H:%M} saved to {report.pdf.name}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reports.snapshots import refresh_report_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the report rollups from the raw tables and take a fresh report snapshot'
+
+    def handle(self, *args, **options):
+        snapshot, stats = refresh_report_snapshots()
+        self.stdout.write(self.style.SUCCESS(
+            f'Report snapshot taken at {snapshot.taken_at:%Y-%m-%d %H:%M} '
+            f'({stats.total_students} students, {stats.actions_today} actions today)'
+        ))
@@ -0,0 +1,166 @@
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Count
+
+from accounts.models import User
+from notifications.models import Notification
+from permissions_app.access import accessible_file_ids
+from students.models import Student, StudentFile
+
+
+# Headline numbers shown on the dashboards. Each is a named metric cached
+# in the STATS_CACHE cache for its own timeout; per-user metrics are cached
+# once per user. Metrics list the sources they read ('users', 'students',
+# ...) and write paths call invalidate_stats() with the source they
+# changed, so a page view between writes runs no COUNT query at all. Like
+# the counters, keys carry a version per metric: invalidating a source
+# gives its metrics a new version. (The reports pages read the latest
+# ReportSnapshot instead, which is already reused for a while.)
+
+_metrics = {}
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    compute: Callable
+    timeout: int  # seconds
+    sources: tuple[str, ...]
+    per_user: bool = False
+
+
+def metric(name, timeout, sources=(), per_user=False):
+    """Decorator registering a function as the named metric.
+
+    Per-user metrics receive the user, the others no argument.
+    """
+    def decorator(func):
+        _metrics[name] = Metric(name, func, timeout, tuple(sources), per_user)
+        return func
+    return decorator
+
+
+def _cache():
+    return caches[getattr(settings, 'STATS_CACHE', 'default')]
+
+
+def _version_key(name):
+    return f'stats:version:{name}'
+
+
+def _versions(cache, names):
+    keys = {name: _version_key(name) for name in names}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = time.time_ns()
+            cache.add(key, version, None)
+            version = cache.get(key, version)
+        versions[name] = version
+    return versions
+
+
+def _key(metric, version, user_id=None):
+    if metric.per_user:
+        return f'stats:{metric.name}:{version}:{user_id}'
+    return f'stats:{metric.name}:{version}'
+
+
+def get_stats(*names, user=None):
+    """{name: value} of the given metrics; only uncached ones are computed."""
+    cache = _cache()
+    metrics = [_metrics[name] for name in names]
+    versions = _versions(cache, names)
+    keys = {m.name: _key(m, versions[m.name], user and user.pk) for m in metrics}
+    cached = cache.get_many(keys.values())
+
+    values = {}
+    for m in metrics:
+        key = keys[m.name]
+        if key in cached:
+            values[m.name] = cached[key]
+        else:
+            values[m.name] = m.compute(user) if m.per_user else m.compute()
+            cache.set(key, values[m.name], m.timeout)
+    return values
+
+
+def get_stat(name, user=None):
+    return get_stats(name, user=user)[name]
+
+
+def invalidate_stats(source, user_ids=None):
+    """Drop the cached metrics that read ``source``.
+
+    With ``user_ids``, per-user metrics are only dropped for those users;
+    metrics shared by everyone always are.
+    """
+    def invalidate():
+        cache = _cache()
+        metrics = [m for m in _metrics.values() if source in m.sources]
+        shared = [m for m in metrics if not m.per_user or user_ids is None]
+        cache.set_many({_version_key(m.name): time.time_ns() for m in shared}, None)
+
+        per_user = [m for m in metrics if m.per_user and user_ids is not None]
+        if per_user:
+            versions = _versions(cache, [m.name for m in per_user])
+            cache.delete_many([
+                _key(m, versions[m.name], user_id) for m in per_user for user_id in user_ids
+            ])
+
+    invalidate()
+    # Another request may cache the old value before this transaction commits
+    if connection.in_atomic_block:
+        transaction.on_commit(invalidate)
+
+
+# ===== METRICS =====
+
+@metric('staff_by_role', timeout=600, sources=['users'])
+def staff_by_role():
+    """Active users per role."""
+    return dict(
+        User.objects.filter(is_active=True).order_by().values_list('role').annotate(Count('pk'))
+    )
+
+
+@metric('total_students', timeout=300, sources=['students'])
+def total_students():
+    return Student.objects.count()
+
+
+@metric('total_files', timeout=600, sources=['files'])
+def total_files():
+    return StudentFile.objects.filter(is_active=True).count()
+
+
+@metric('pending_notifications', timeout=120, sources=['notifications'])
+def pending_notifications():
+    return Notification.objects.filter(status='pending').count()
+
+
+@metric('requests_by_status', timeout=300, sources=['notifications'], per_user=True)
+def requests_by_status(user):
+    """The user's edit requests per status."""
+    return dict(
+        Notification.objects.filter(requested_by=user).order_by().values_list('status').annotate(Count('pk'))
+    )
+
+
+@metric('assigned_files', timeout=600, sources=['permissions'], per_user=True)
+def assigned_files(user):
+    """Files granted to a teacher or guardian."""
+    return len(accessible_file_ids(user) or ())
+
+
+@metric('assigned_students', timeout=300, sources=['students', 'permissions'], per_user=True)
+def assigned_students(user):
+    """Students in the files granted to a teacher or guardian."""
+    return Student.objects.filter(file_id__in=accessible_file_ids(user) or ()).count()
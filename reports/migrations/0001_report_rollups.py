@@ -0,0 +1,57 @@
+# Generated by Django 5.1 on 2026-10-18 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('students', '0003_columnmappingprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('logins', models.IntegerField(default=0)),
+                ('actions', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'report_daily_activity',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(db_index=True)),
+                ('stats', models.JSONField()),
+            ],
+            options={
+                'db_table': 'report_snapshots',
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(max_length=100)),
+                ('division', models.CharField(max_length=10)),
+                ('year', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='students.studentfile')),
+            ],
+            options={
+                'db_table': 'report_student_rollups',
+                'unique_together': {('file', 'class_name', 'division', 'year', 'status')},
+            },
+        ),
+    ]
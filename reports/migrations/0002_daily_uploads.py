@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_report_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyactivity',
+            name='files_uploaded',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyactivity',
+            name='students_imported',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_daily_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('pdf', models.FileField(upload_to='summary_reports/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'summary_reports',
+                'ordering': ['-taken_at'],
+            },
+        ),
+    ]
@@ -1,4 +1,71 @@
 from django.db import models
 
-# Create your models here.
-# Reports app uses data from other models - no new models needed
\ No newline at end of file
+
+# Rollups behind the reports pages (see reports/snapshots.py). They are
+# kept up to date from signals and rebuilt by `manage.py
+# refresh_report_snapshots`; reports never scan the raw tables.
+
+
+class StudentRollup(models.Model):
+    """Number of students of a file per class, division, year and status."""
+    file = models.ForeignKey(
+        'students.StudentFile',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    class_name = models.CharField(max_length=100)
+    division = models.CharField(max_length=10)
+    year = models.CharField(max_length=50)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_student_rollups'
+        unique_together = ['file', 'class_name', 'division', 'year', 'status']
+
+    def __str__(self):
+        return f"{self.class_name} {self.division} {self.year} {self.status}: {self.count}"
+
+
+class DailyActivity(models.Model):
+    """Per-day totals of security log entries and of the (active) student
+    files uploaded that day."""
+    date = models.DateField(unique=True)
+    logins = models.IntegerField(default=0)
+    actions = models.IntegerField(default=0)
+    files_uploaded = models.IntegerField(default=0)
+    students_imported = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_daily_activity'
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date}: {self.actions} actions"
+
+
+class ReportSnapshot(models.Model):
+    """ReportStats as of ``taken_at``, reused for REPORT_SNAPSHOT_MAX_AGE."""
+    taken_at = models.DateTimeField(db_index=True)
+    stats = models.JSONField()
+
+    class Meta:
+        db_table = 'report_snapshots'
+        ordering = ['-taken_at']
+
+    def __str__(self):
+        return f"Report snapshot {self.taken_at}"
+
+
+class SummaryReport(models.Model):
+    """Summary PDF of the report snapshot taken at ``taken_at``."""
+    taken_at = models.DateTimeField(unique=True)
+    pdf = models.FileField(upload_to='summary_reports/')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'summary_reports'
+        ordering = ['-taken_at']
+
+    def __str__(self):
+        return f"Summary report {self.taken_at}"
@@ -0,0 +1,121 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import SecurityLog, User
+from notifications.models import Notification
+from permissions_app.models import FilePermission
+from students.models import Student, StudentFile
+from .metrics import invalidate_stats
+from .snapshots import (
+    adjust_student_rollup, adjust_upload_counts, count_security_log, end_bulk_change,
+    in_bulk_change, rebuild_upload_counts, start_bulk_change, student_group, upload_counts,
+)
+from .stats import STUDENT_GROUP_FIELDS
+
+
+# Keep the report rollups (reports/models.py) and the cached metrics
+# (reports/metrics.py) in step with single-row writes. Bulk writes send no
+# signals, and deletes of many students (a whole file, missing rows in a
+# sync) skip the per-row updates; see bulk_student_changes().
+
+@receiver(pre_save, sender=Student)
+def remember_student_group(sender, instance, **kwargs):
+    # Read from the row rather than kept from post_init, so loading
+    # students costs nothing; only single-row saves pay the extra query
+    instance._report_group = None
+    if not instance._state.adding:
+        instance._report_group = (
+            Student.objects.filter(pk=instance.pk).values('file_id', *STUDENT_GROUP_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Student)
+def count_student(sender, instance, created, **kwargs):
+    group = student_group(instance)
+    old_group = instance._report_group
+    if created or old_group is None:
+        adjust_student_rollup(group, 1)
+    elif group != old_group:
+        adjust_student_rollup(old_group, -1)
+        adjust_student_rollup(group, 1)
+    if created or old_group is None or group['file_id'] != old_group['file_id']:
+        invalidate_stats('students')
+
+
+@receiver(post_delete, sender=Student)
+def uncount_student(sender, instance, **kwargs):
+    if in_bulk_change(instance.file_id):
+        return
+    adjust_student_rollup(student_group(instance), -1)
+    invalidate_stats('students')
+
+
+@receiver(post_init, sender=StudentFile)
+def remember_upload_counts(sender, instance, **kwargs):
+    if 'is_active' in instance.__dict__ and 'total_students' in instance.__dict__:
+        instance._upload_counts = upload_counts(instance)
+
+
+@receiver(post_save, sender=StudentFile)
+def count_upload(sender, instance, created, **kwargs):
+    # Imports add their file inactive and activate it with its student
+    # count once every row is in; deleting a file deactivates it
+    old = (0, 0) if created else getattr(instance, '_upload_counts', None)
+    new = upload_counts(instance)
+    if old is None:
+        # Loaded without them: recount the upload day
+        rebuild_upload_counts(timezone.localdate(instance.upload_date))
+    else:
+        adjust_upload_counts(instance, new[0] - old[0], new[1] - old[1])
+    instance._upload_counts = new
+
+
+@receiver(pre_delete, sender=StudentFile)
+def start_file_delete(sender, instance, **kwargs):
+    # Its students and rollup rows go with it in the same delete
+    start_bulk_change(instance.pk)
+
+
+@receiver(post_delete, sender=StudentFile)
+def uncount_upload(sender, instance, **kwargs):
+    end_bulk_change(instance.pk)
+    invalidate_stats('students')
+    files, students = getattr(instance, '_upload_counts', None) or upload_counts(instance)
+    adjust_upload_counts(instance, -files, -students)
+
+
+@receiver(post_save, sender=SecurityLog)
+def count_security_log_entry(sender, instance, created, **kwargs):
+    if created:
+        count_security_log(instance)
+
+
+# Fields the metrics read; saves touching only others (last_login) are skipped
+USER_METRIC_FIELDS = {'role', 'is_active'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or USER_METRIC_FIELDS & set(update_fields):
+        invalidate_stats('users')
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_stats('users')
+
+
+@receiver([post_save, post_delete], sender=StudentFile)
+def student_file_changed(sender, instance, **kwargs):
+    invalidate_stats('files')
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    invalidate_stats('notifications', [instance.requested_by_id])
+
+
+@receiver([post_save, post_delete], sender=FilePermission)
+def file_permission_changed(sender, instance, **kwargs):
+    invalidate_stats('permissions', [instance.user_id])
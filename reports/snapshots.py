@@ -0,0 +1,195 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyActivity, ReportSnapshot, StudentRollup
+from .stats import STUDENT_GROUP_FIELDS, ReportStats, grouped_counts, rollup_report_stats
+
+
+# Reports read the latest ReportSnapshot while it is younger than
+# REPORT_SNAPSHOT_MAX_AGE seconds and take a new one from the rollup tables
+# otherwise. The rollups follow every change through reports/signals.py;
+# bulk writes (imports, syncs and whole-file deletes) run inside
+# bulk_student_changes() or call rebuild_student_rollup() for their file,
+# and `manage.py refresh_report_snapshots` rebuilds everything.
+
+# Snapshots older than this are deleted when a new one is taken.
+SNAPSHOT_RETENTION = timedelta(days=7)
+
+
+def _bump(model, lookup, **deltas):
+    """Add ``deltas`` to the rollup row matching ``lookup``, creating it if needed."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # Nothing counted yet; the next rebuild sets the row
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created concurrently
+        model.objects.filter(**lookup).update(**changes)
+
+
+# ===== STUDENTS =====
+
+def student_group(student):
+    """The StudentRollup row a student is counted in, as lookup kwargs."""
+    return dict({'file_id': student.file_id}, **{f: getattr(student, f) for f in STUDENT_GROUP_FIELDS})
+
+
+def adjust_student_rollup(group, delta):
+    _bump(StudentRollup, group, count=delta)
+
+
+def rebuild_student_rollup(file_id=None):
+    """Recount the rollup rows of one file (None: of every file)."""
+    from students.models import Student
+
+    students = Student.objects.all()
+    rows = StudentRollup.objects.all()
+    if file_id is not None:
+        students = students.filter(file_id=file_id)
+        rows = rows.filter(file_id=file_id)
+
+    counts = grouped_counts(students, ('file_id',) + STUDENT_GROUP_FIELDS)
+    with transaction.atomic():
+        rows.delete()
+        StudentRollup.objects.bulk_create([
+            StudentRollup(count=count, **dict(zip(('file_id',) + STUDENT_GROUP_FIELDS, key)))
+            for key, count in counts.items()
+        ])
+
+
+# Files whose students are being changed in bulk, per thread; the per-row
+# signals (rollups here, cached exports in students/signals.py) leave them
+# alone
+_bulk = threading.local()
+
+
+def in_bulk_change(file_id):
+    return file_id in getattr(_bulk, 'file_ids', ())
+
+
+def start_bulk_change(file_id):
+    _bulk.__dict__.setdefault('file_ids', set()).add(file_id)
+
+
+def end_bulk_change(file_id):
+    getattr(_bulk, 'file_ids', set()).discard(file_id)
+
+
+@contextmanager
+def bulk_student_changes(file_id):
+    """Skip the per-row rollup updates for the students of one file and
+    recount the file once at the end."""
+    start_bulk_change(file_id)
+    try:
+        yield
+    finally:
+        end_bulk_change(file_id)
+    rebuild_student_rollup(file_id)
+
+
+# ===== DAILY ACTIVITY =====
+
+def count_security_log(entry):
+    """Add a new SecurityLog entry to its day's totals."""
+    _bump(
+        DailyActivity, {'date': timezone.localdate(entry.timestamp)},
+        actions=1, logins=int(entry.action == 'login'),
+    )
+
+
+def upload_counts(student_file):
+    """(files, students) a StudentFile adds to its upload day's totals."""
+    if not student_file.is_active:
+        return 0, 0
+    return 1, student_file.total_students
+
+
+def adjust_upload_counts(student_file, files, students):
+    if files or students:
+        _bump(
+            DailyActivity, {'date': timezone.localdate(student_file.upload_date)},
+            files_uploaded=files, students_imported=students,
+        )
+
+
+def rebuild_upload_counts(day):
+    """Recount one day's uploads from the student files."""
+    from students.models import StudentFile
+
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    totals = StudentFile.objects.filter(
+        is_active=True, upload_date__gte=start, upload_date__lt=start + timedelta(days=1),
+    ).aggregate(
+        files_uploaded=Count('pk'),
+        students_imported=Coalesce(Sum('total_students'), 0),
+    )
+    DailyActivity.objects.update_or_create(date=day, defaults=totals)
+
+
+def rebuild_daily_activity():
+    from accounts.models import SecurityLog
+    from students.models import StudentFile
+
+    days = defaultdict(dict)
+    logs = SecurityLog.objects.annotate(date=TruncDate('timestamp')).order_by().values('date').annotate(
+        actions=Count('pk'),
+        logins=Count('pk', filter=Q(action='login')),
+    )
+    # total_students is kept on the file, so no join to students
+    uploads = StudentFile.objects.filter(is_active=True).annotate(
+        date=TruncDate('upload_date'),
+    ).order_by().values('date').annotate(
+        files_uploaded=Count('pk'),
+        students_imported=Sum('total_students'),
+    )
+    for row in [*logs, *uploads]:
+        days[row.pop('date')].update(row)
+
+    with transaction.atomic():
+        DailyActivity.objects.all().delete()
+        DailyActivity.objects.bulk_create([DailyActivity(date=date, **totals) for date, totals in days.items()])
+
+
+# ===== SNAPSHOTS =====
+
+def take_report_snapshot():
+    """Store the current ReportStats as a new snapshot and return it."""
+    now = timezone.now()
+    stats = rollup_report_stats(now)
+    snapshot = ReportSnapshot.objects.create(taken_at=now, stats=stats.to_json())
+    ReportSnapshot.objects.filter(taken_at__lt=now - SNAPSHOT_RETENTION).delete()
+    stats.taken_at = now
+    return snapshot, stats
+
+
+def get_report_stats(max_age=None):
+    """ReportStats from the latest snapshot, or a new one if it is too old."""
+    if max_age is None:
+        max_age = settings.REPORT_SNAPSHOT_MAX_AGE
+
+    snapshot = ReportSnapshot.objects.filter(
+        taken_at__gte=timezone.now() - timedelta(seconds=max_age)
+    ).first()
+    if snapshot is not None:
+        return ReportStats.from_json(snapshot.stats, snapshot.taken_at)
+    return take_report_snapshot()[1]
+
+
+def refresh_report_snapshots():
+    """Rebuild every rollup from the raw tables, then take a snapshot."""
+    rebuild_student_rollup()
+    rebuild_daily_activity()
+    return take_report_snapshot()
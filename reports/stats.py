@@ -0,0 +1,196 @@
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from accounts.models import SecurityLog, User
+from announcements.models import Announcement
+from notifications.models import Notification
+from students.models import Student, StudentFile
+
+
+# The reports page and summary PDF are built from a handful of grouped
+# queries. Each table is grouped once by every column a chart needs (the
+# combination of all of them, like GROUP BY GROUPING SETS but portable);
+# the per-column breakdowns are summed up from those rows in Python.
+
+
+@dataclass
+class ReportStats:
+    """Counts shown on the reports dashboard and in the summary PDF.
+
+    Breakdowns map a column value to a count, ordered by value.
+    """
+    students_by_class: dict[str, int]
+    students_by_division: dict[str, int]
+    students_by_year: dict[str, int]
+    students_by_status: dict[str, int]
+    # Active users only
+    staff_by_role: dict[str, int]
+    staff_by_department: dict[str, int]
+    staff_by_department_role: dict[str, dict[str, int]]
+    notifications_by_status: dict[str, int]
+    notifications_by_field: dict[str, int]
+    total_files: int
+    total_announcements: int
+    logins_today: int
+    actions_today: int
+    # When the counts were taken (ReportSnapshot), None if live
+    taken_at: datetime | None = None
+
+    @property
+    def total_students(self):
+        return sum(self.students_by_status.values())
+
+    @property
+    def total_staff(self):
+        return sum(self.staff_by_role.values())
+
+    @property
+    def total_teachers(self):
+        return self.staff_by_role.get('teacher', 0)
+
+    @property
+    def total_guardians(self):
+        return self.staff_by_role.get('guardian', 0)
+
+    @property
+    def total_hods(self):
+        return self.staff_by_role.get('hod', 0)
+
+    @property
+    def total_notifications(self):
+        return sum(self.notifications_by_status.values())
+
+    @property
+    def pending_notifications(self):
+        return self.notifications_by_status.get('pending', 0)
+
+    @property
+    def resolved_notifications(self):
+        return self.notifications_by_status.get('resolved', 0)
+
+    @property
+    def dismissed_notifications(self):
+        return self.notifications_by_status.get('dismissed', 0)
+
+    def top_edit_fields(self, limit=5):
+        """The most requested edit fields, as (field, count), most first."""
+        return Counter(self.notifications_by_field).most_common(limit)
+
+    def to_json(self):
+        data = asdict(self)
+        del data['taken_at']
+        return data
+
+    @classmethod
+    def from_json(cls, data, taken_at=None):
+        return cls(**data, taken_at=taken_at)
+
+
+STUDENT_GROUP_FIELDS = ('class_name', 'division', 'year', 'status')
+
+
+def grouped_counts(queryset, fields):
+    """{(value of each field): row count} with one GROUP BY query."""
+    return {
+        tuple(row[f] for f in fields): row['count']
+        for row in queryset.order_by().values(*fields).annotate(count=Count('pk'))
+    }
+
+
+def rollup(counts, position):
+    """Sum grouped_counts() rows by the field at ``position``, ordered by value."""
+    totals = Counter()
+    for key, count in counts.items():
+        totals[key[position]] += count
+    return dict(sorted(totals.items()))
+
+
+def start_of_day(now=None):
+    return timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _staff_stats(staff):
+    by_department_role = {}
+    for (role, department), count in sorted(staff.items(), key=lambda item: item[0][::-1]):
+        if department:
+            by_department_role.setdefault(department, {})[role] = count
+    return {
+        'staff_by_role': rollup(staff, 0),
+        'staff_by_department': rollup({k: v for k, v in staff.items() if k[1]}, 1),
+        'staff_by_department_role': by_department_role,
+    }
+
+
+def _student_stats(students):
+    return {
+        'students_by_class': rollup(students, 0),
+        'students_by_division': rollup(students, 1),
+        'students_by_year': rollup(students, 2),
+        'students_by_status': rollup(students, 3),
+    }
+
+
+def _small_table_stats():
+    """Users, edit requests, files and announcements: small tables, read live."""
+    staff = grouped_counts(User.objects.filter(is_active=True), ('role', 'department'))
+    notifications = grouped_counts(Notification.objects.all(), ('status', 'field_to_edit'))
+    return dict(
+        _staff_stats(staff),
+        notifications_by_status=rollup(notifications, 0),
+        notifications_by_field=rollup(notifications, 1),
+        total_files=StudentFile.objects.filter(is_active=True).count(),
+        total_announcements=Announcement.objects.filter(is_active=True).count(),
+    )
+
+
+def compute_report_stats(now=None):
+    """Gather a ReportStats from the live tables (six queries)."""
+    students = grouped_counts(Student.objects.all(), STUDENT_GROUP_FIELDS)
+    today = SecurityLog.objects.filter(timestamp__gte=start_of_day(now)).aggregate(
+        actions=Count('pk'),
+        logins=Count('pk', filter=Q(action='login')),
+    )
+    return ReportStats(
+        **_student_stats(students),
+        **_small_table_stats(),
+        logins_today=today['logins'],
+        actions_today=today['actions'],
+    )
+
+
+def rollup_report_stats(now=None):
+    """Gather a ReportStats from the rollup tables instead of students and
+    security logs, so the cost does not grow with their size."""
+    from .models import DailyActivity, StudentRollup
+
+    students = {
+        tuple(row[f] for f in STUDENT_GROUP_FIELDS): row['count']
+        for row in StudentRollup.objects.filter(count__gt=0).order_by().values(*STUDENT_GROUP_FIELDS).annotate(
+            count=Sum('count'),
+        )
+    }
+    today = DailyActivity.objects.filter(date=start_of_day(now).date()).first()
+    return ReportStats(
+        **_student_stats(students),
+        **_small_table_stats(),
+        logins_today=today.logins if today else 0,
+        actions_today=today.actions if today else 0,
+    )
+
+
+def upload_timeline(days, now=None):
+    """Files uploaded and students imported per day over the last ``days``
+    days, as (date, files, students) oldest first, from the DailyActivity
+    rollup. Days without uploads are left out."""
+    from .models import DailyActivity
+
+    since = start_of_day(now).date() - timedelta(days=days - 1)
+    return list(
+        DailyActivity.objects.filter(date__gte=since, files_uploaded__gt=0).order_by('date').values_list(
+            'date', 'files_uploaded', 'students_imported',
+        )
+    )
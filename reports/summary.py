@@ -0,0 +1,85 @@
+import importlib.util
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.utils import enqueue
+from students.models import StudentFile
+from students.pdfs import html_to_pdf
+from .models import SummaryReport
+from .snapshots import get_report_stats
+
+
+# Summary PDFs are built by the 'summary_pdf' job (reports/tasks.py) or by
+# `manage.py generate_daily_report`, one per report snapshot. Downloads get
+# the latest stored PDF straight away; when it is older than
+# REPORT_SNAPSHOT_MAX_AGE a newer one is queued behind it.
+
+SUMMARY_TEMPLATE = 'reports/summary_pdf.html'
+
+# Reports older than this are deleted when a new one is stored.
+SUMMARY_REPORT_RETENTION = timedelta(days=30)
+
+# A summary job running for longer than this is taken to be stuck: a new
+# one is queued instead of waiting on it (run_jobs fails it later).
+SUMMARY_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+def pdf_available():
+    return importlib.util.find_spec('xhtml2pdf') is not None
+
+
+def is_fresh(report):
+    return report.taken_at >= timezone.now() - timedelta(seconds=settings.REPORT_SNAPSHOT_MAX_AGE)
+
+
+def build_summary_report(stats=None):
+    """Render the summary PDF of a report snapshot (the current one by
+    default) and store it, or return the one already stored for it."""
+    if not pdf_available():
+        raise RuntimeError('PDF generation is not available (xhtml2pdf is not installed).')
+
+    stats = stats or get_report_stats()
+    report = SummaryReport.objects.filter(taken_at=stats.taken_at).first()
+    if report is not None:
+        return report
+
+    html = render_to_string(SUMMARY_TEMPLATE, {
+        'stats': stats,
+        'recent_files': StudentFile.objects.filter(is_active=True).order_by('-upload_date')[:10],
+        'generated_at': stats.taken_at,
+    })
+    pdf = html_to_pdf(html)
+    if pdf is None:
+        raise ValueError('The summary PDF could not be rendered.')
+
+    report = SummaryReport(taken_at=stats.taken_at)
+    name = f'SMS_Summary_Report_{timezone.localtime(stats.taken_at):%Y%m%d_%H%M%S}.pdf'
+    report.pdf.save(name, ContentFile(pdf), save=False)
+    try:
+        with transaction.atomic():
+            report.save()
+    except IntegrityError:
+        # Built concurrently for the same snapshot
+        report.pdf.delete(save=False)
+        return SummaryReport.objects.get(taken_at=stats.taken_at)
+
+    for old in SummaryReport.objects.filter(taken_at__lt=timezone.now() - SUMMARY_REPORT_RETENTION):
+        old.pdf.delete(save=False)
+        old.delete()
+    return report
+
+
+def queue_summary_report(user=None):
+    """The pending or recently started summary job, or a newly queued one."""
+    job = Job.objects.filter(
+        Q(status='pending') | Q(status='running', started_at__gte=timezone.now() - SUMMARY_JOB_TIMEOUT),
+        kind='summary_pdf',
+    ).first()
+    return job or enqueue('summary_pdf', created_by=user)
@@ -0,0 +1,13 @@
+from django.urls import reverse
+
+from jobs.utils import register
+from .summary import build_summary_report
+
+
+@register('summary_pdf')
+def summary_pdf_job(job):
+    """Build the summary PDF of the current report snapshot."""
+    job.set_progress(total=1, rendered=0)
+    report = build_summary_report()
+    job.set_progress(rendered=1)
+    job.result_url = reverse('summary_report_download', args=[report.pk])
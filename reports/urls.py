@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('reports/', views.reports_dashboard, name='reports_dashboard'),
     path('reports/export-pdf/', views.export_summary_pdf, name='export_summary_pdf'),
+    path('reports/summary/<int:pk>/', views.summary_report_download, name='summary_report_download'),
 ]
\ No newline at end of file
@@ -1,16 +1,26 @@
 import json
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, redirect, render
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.db.models import Count, Q
+from django.http import FileResponse
+from django.urls import reverse
+from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
 
 from accounts.decorators import admin_required, role_required
-from accounts.models import User, SecurityLog
-from students.models import StudentFile, Student
+from accounts.models import SecurityLog
+from jobs.models import Job
+from students.models import StudentFile
 from notifications.models import Notification
-from announcements.models import Announcement
+from .models import SummaryReport
+from .snapshots import get_report_stats
+from .stats import upload_timeline
+from .summary import is_fresh, pdf_available, queue_summary_report
+
+
+# Day ranges offered for the upload history chart; the first is the default
+UPLOAD_HISTORY_RANGES = (30, 90, 365)
 
 
 @login_required
@@ -18,109 +28,48 @@ from announcements.models import Announcement
 def reports_dashboard(request):
     """Main reports page with charts and analytics."""
 
+    stats = get_report_stats()
+
     # === STUDENT STATISTICS ===
 
-    # Class-wise student count
-    class_wise = Student.objects.values('class_name').annotate(
-        count=Count('id')
-    ).order_by('class_name')
-    class_labels = [item['class_name'] for item in class_wise]
-    class_data = [item['count'] for item in class_wise]
-
-    # Division-wise distribution
-    division_wise = Student.objects.values('division').annotate(
-        count=Count('id')
-    ).order_by('division')
-    division_labels = [f"Division {item['division']}" for item in division_wise]
-    division_data = [item['count'] for item in division_wise]
-
-    # Year-wise distribution
-    year_wise = Student.objects.values('year').annotate(
-        count=Count('id')
-    ).order_by('year')
-    year_labels = [item['year'] for item in year_wise]
-    year_data = [item['count'] for item in year_wise]
-
-    # Status-wise distribution
-    status_wise = Student.objects.values('status').annotate(
-        count=Count('id')
-    ).order_by('status')
-    status_labels = [item['status'].title() for item in status_wise]
-    status_data = [item['count'] for item in status_wise]
+    class_labels = list(stats.students_by_class)
+    class_data = list(stats.students_by_class.values())
+    division_labels = [f"Division {division}" for division in stats.students_by_division]
+    division_data = list(stats.students_by_division.values())
+    year_labels = list(stats.students_by_year)
+    year_data = list(stats.students_by_year.values())
+    status_labels = [status.title() for status in stats.students_by_status]
+    status_data = list(stats.students_by_status.values())
 
     # === STAFF STATISTICS ===
 
-    # Department-wise staff count
-    dept_wise = User.objects.filter(
-        is_active=True
-    ).exclude(department='').values('department').annotate(
-        count=Count('id')
-    ).order_by('department')
-    dept_labels = [item['department'] for item in dept_wise]
-    dept_data = [item['count'] for item in dept_wise]
-
-    # Role-wise staff count
-    role_wise = User.objects.filter(
-        is_active=True
-    ).values('role').annotate(
-        count=Count('id')
-    ).order_by('role')
+    dept_labels = list(stats.staff_by_department)
+    dept_data = list(stats.staff_by_department.values())
     role_map = {'admin': 'Admin', 'hod': 'HOD', 'teacher': 'Teacher', 'guardian': 'Guardian'}
-    role_labels = [role_map.get(item['role'], item['role']) for item in role_wise]
-    role_data = [item['count'] for item in role_wise]
+    role_labels = [role_map.get(role, role) for role in stats.staff_by_role]
+    role_data = list(stats.staff_by_role.values())
 
     # === UPLOAD HISTORY ===
 
-    # Last 30 days upload history
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    upload_history = StudentFile.objects.filter(
-        upload_date__gte=thirty_days_ago,
-        is_active=True
-    ).values('upload_date__date').annotate(
-        count=Count('id'),
-        students=Count('students')
-    ).order_by('upload_date__date')
+    try:
+        upload_range = int(request.GET.get('range', UPLOAD_HISTORY_RANGES[0]))
+    except ValueError:
+        upload_range = UPLOAD_HISTORY_RANGES[0]
+    if upload_range not in UPLOAD_HISTORY_RANGES:
+        upload_range = UPLOAD_HISTORY_RANGES[0]
 
-    upload_dates = [item['upload_date__date'].strftime('%d %b') for item in upload_history]
-    upload_counts = [item['count'] for item in upload_history]
-    upload_student_counts = [item['students'] for item in upload_history]
+    upload_history = upload_timeline(upload_range)
+    upload_dates = [date.strftime('%d %b %Y' if upload_range > 90 else '%d %b') for date, _, _ in upload_history]
+    upload_counts = [files for _, files, _ in upload_history]
+    upload_student_counts = [students for _, _, students in upload_history]
 
     # === NOTIFICATION STATISTICS ===
 
-    notif_stats = {
-        'total': Notification.objects.count(),
-        'pending': Notification.objects.filter(status='pending').count(),
-        'resolved': Notification.objects.filter(status='resolved').count(),
-        'dismissed': Notification.objects.filter(status='dismissed').count(),
-    }
-
     # Most requested edit fields
-    field_wise = Notification.objects.values('field_to_edit').annotate(
-        count=Count('id')
-    ).order_by('-count')[:5]
     field_map = dict(Notification.FIELD_CHOICES)
-    field_labels = [field_map.get(item['field_to_edit'], item['field_to_edit']) for item in field_wise]
-    field_data = [item['count'] for item in field_wise]
-
-    # === SUMMARY NUMBERS ===
-
-    summary = {
-        'total_students': Student.objects.count(),
-        'total_files': StudentFile.objects.filter(is_active=True).count(),
-        'total_teachers': User.objects.filter(role='teacher', is_active=True).count(),
-        'total_guardians': User.objects.filter(role='guardian', is_active=True).count(),
-        'total_hods': User.objects.filter(role='hod', is_active=True).count(),
-        'total_staff': User.objects.filter(is_active=True).count(),
-        'total_announcements': Announcement.objects.filter(is_active=True).count(),
-        'total_notifications': Notification.objects.count(),
-        'logins_today': SecurityLog.objects.filter(
-            action='login',
-            timestamp__date=timezone.now().date()
-        ).count(),
-        'actions_today': SecurityLog.objects.filter(
-            timestamp__date=timezone.now().date()
-        ).count(),
-    }
+    top_fields = stats.top_edit_fields()
+    field_labels = [field_map.get(field, field) for field, _ in top_fields]
+    field_data = [count for _, count in top_fields]
 
     # === RECENT UPLOADS ===
 
@@ -130,15 +79,21 @@ def reports_dashboard(request):
 
     # === TOP ACTIVE USERS ===
 
+    thirty_days_ago = timezone.now() - timedelta(days=30)
     active_users = SecurityLog.objects.filter(
         timestamp__gte=thirty_days_ago
     ).values('user__full_name', 'user__role').annotate(
         action_count=Count('id')
     ).order_by('-action_count')[:5]
 
+    job = None
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = Job.objects.filter(pk=job_id, kind='summary_pdf').first()
+
     context = {
-        'summary': summary,
-        'notif_stats': notif_stats,
+        'stats': stats,
+        'job': job,
         'recent_uploads': recent_uploads,
         'active_users': active_users,
         # Chart data as JSON
@@ -156,6 +111,9 @@ def reports_dashboard(request):
         'role_data': json.dumps(role_data),
         'upload_dates': json.dumps(upload_dates),
         'upload_counts': json.dumps(upload_counts),
+        'upload_student_counts': json.dumps(upload_student_counts),
+        'upload_range': upload_range,
+        'upload_ranges': UPLOAD_HISTORY_RANGES,
         'field_labels': json.dumps(field_labels),
         'field_data': json.dumps(field_data),
     }
@@ -166,66 +124,33 @@ def reports_dashboard(request):
 @login_required
 @admin_required
 def export_summary_pdf(request):
-    """Export summary report as PDF."""
-    from io import BytesIO
-    from django.template.loader import render_to_string
-
-    summary = {
-        'total_students': Student.objects.count(),
-        'total_files': StudentFile.objects.filter(is_active=True).count(),
-        'total_teachers': User.objects.filter(role='teacher', is_active=True).count(),
-        'total_guardians': User.objects.filter(role='guardian', is_active=True).count(),
-        'total_hods': User.objects.filter(role='hod', is_active=True).count(),
-        'total_announcements': Announcement.objects.filter(is_active=True).count(),
-        'pending_notifications': Notification.objects.filter(status='pending').count(),
-    }
+    """Download the latest summary PDF. When it is out of date a newer one
+    is built in the background and the stored one is served meanwhile."""
+    if not pdf_available():
+        messages.error(request, 'PDF generation not available.')
+        return redirect('reports_dashboard')
 
-    class_wise = Student.objects.values('class_name').annotate(
-        count=Count('id')
-    ).order_by('class_name')
+    report = SummaryReport.objects.first()
+    if report is None or not is_fresh(report):
+        job = queue_summary_report(request.user)
+        if job.status == 'done':
+            # JOBS_EAGER has already built it
+            report = SummaryReport.objects.first()
+        if report is None:
+            messages.info(request, 'Building the summary report in the background...')
+            return redirect(f"{reverse('reports_dashboard')}?job={job.pk}")
 
-    division_wise = Student.objects.values('division').annotate(
-        count=Count('id')
-    ).order_by('division')
+    return _summary_response(report)
 
-    year_wise = Student.objects.values('year').annotate(
-        count=Count('id')
-    ).order_by('year')
 
-    recent_files = StudentFile.objects.filter(
-        is_active=True
-    ).order_by('-upload_date')[:10]
+@login_required
+@admin_required
+def summary_report_download(request, pk):
+    """Download a stored summary PDF."""
+    return _summary_response(get_object_or_404(SummaryReport, pk=pk))
 
-    staff_by_dept = User.objects.filter(
-        is_active=True
-    ).exclude(department='').values('department', 'role').annotate(
-        count=Count('id')
-    ).order_by('department', 'role')
 
-    try:
-        from xhtml2pdf import pisa
-
-        html_string = render_to_string('reports/summary_pdf.html', {
-            'summary': summary,
-            'class_wise': class_wise,
-            'division_wise': division_wise,
-            'year_wise': year_wise,
-            'recent_files': recent_files,
-            'staff_by_dept': staff_by_dept,
-            'generated_at': timezone.now(),
-        })
-
-        result = BytesIO()
-        pdf = pisa.CreatePDF(BytesIO(html_string.encode('utf-8')), dest=result)
-
-        if not pdf.err:
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="SMS_Summary_Report_{timezone.now().strftime("%Y%m%d")}.pdf"'
-            return response
-
-    except ImportError:
-        pass
-
-    from django.contrib import messages
-    messages.error(request, 'PDF generation not available.')
-    return render(request, 'reports/reports_dashboard.html')
\ No newline at end of file
+def _summary_response(report):
+    return FileResponse(report.pdf.open('rb'), as_attachment=True,
+                        filename=report.pdf.name.rsplit('/', 1)[-1],
+                        content_type='application/pdf')
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'announcements',
     'dashboard',
     'reports',
+    'jobs',
 ]
 
 # ===== MIDDLEWARE =====
@@ -152,6 +153,50 @@ SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_COOKIE_SECURE = not DEBUG
 SESSION_COOKIE_HTTPONLY = True
 
+# ===== CACHE =====
+# The cache must be shared by every web and job worker: counters, stats and
+# cached ids are invalidated from whichever process made the change. Redis
+# with REDIS_URL (e.g. redis://localhost:6379/0), otherwise a database table
+# (created by `python manage.py createcachetable`). 'local' is a
+# per-process cache for hints that may lag a little behind other processes.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+CACHES['local'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'local',
+}
+
+# Cache alias holding the per-user unread counters (accounts/counters.py).
+# Only used with Redis: a hit in the database cache costs more queries than
+# the UserCounters row it saves, so without it the row is read every time.
+COUNTERS_CACHE = 'default' if os.environ.get('REDIS_URL') else None
+# Cache alias holding the dashboard and report figures (reports/metrics.py)
+STATS_CACHE = 'default'
+
+# ===== LIVE UPDATES =====
+# Badge changes and new activity are pushed to /activity/stream/ (server-
+# sent events). Only enable LIVE_UPDATES when the project is served by an
+# ASGI server: under WSGI each open page would hold a worker for the whole
+# stream and receive nothing until it ends. With REDIS_URL events go
+# through Redis pub/sub, otherwise they only reach streams served by the
+# same process.
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', 'False').lower() in ('true', '1', 'yes')
+EVENTS_REDIS_URL = os.environ.get('REDIS_URL', '')
+EVENT_STREAM_TIMEOUT = 300  # seconds before the browser reconnects
+EVENT_STREAM_HEARTBEAT = 20  # seconds between keep-alive comments
+
 # ===== SECURITY SETTINGS (Production) =====
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
@@ -171,6 +216,27 @@ ALLOWED_EXCEL_EXTENSIONS = ['.xlsx', '.xls']
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
  
 
+# ===== BACKGROUND JOBS =====
+# Jobs are run by `python manage.py run_jobs`, which every deploy script
+# (Procfile, render.yaml, Dockerfile, start.sh) starts next to the web
+# server. Uploads and generated files live on the local MEDIA_ROOT, so the
+# worker must run on the same machine (or share the media volume). Set
+# JOBS_EAGER=True to run jobs inside the request instead.
+JOBS_EAGER = os.environ.get('JOBS_EAGER', 'False').lower() in ('true', '1', 'yes')
+JOBS_POLL_INTERVAL = 2  # seconds
+# Jobs running for longer than this are taken to be left behind by a worker
+# that crashed or restarted: they are marked failed and cleaned up.
+JOBS_STALE_AFTER = int(os.environ.get('JOBS_STALE_AFTER', 3600))  # seconds
+
+# Processes converting profile PDFs in batch PDF jobs. They run next to the
+# web and job workers, so raise this only where spare cores exist.
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 1))
+
+# ===== REPORTS =====
+# Report pages reuse a snapshot of their figures for this many seconds
+# (reports/snapshots.py).
+REPORT_SNAPSHOT_MAX_AGE = int(os.environ.get('REPORT_SNAPSHOT_MAX_AGE', 300))
+
 # ===== LOGGING =====
 LOGGING = {
     'version': 1,
@@ -13,6 +13,7 @@ urlpatterns = [
     path('', include('notifications.urls')),
     path('', include('announcements.urls')),
     path('', include('reports.urls')),
+    path('', include('jobs.urls')),
 ]
 
 if settings.DEBUG:
@@ -5,6 +5,7 @@ python manage.py collectstatic --noinput || echo "Collectstatic failed, continui
 
 echo "=== Running Migrations ==="
 python manage.py migrate
+python manage.py createcachetable
 
 echo "=== Creating Admin ==="
 python manage.py create_admin && echo "Admin OK" || echo "Admin failed, continuing..."
@@ -12,6 +13,9 @@ python manage.py create_admin && echo "Admin OK" || echo "Admin failed, continui
 echo "=== Testing WSGI Import ==="
 python -c "from sms_project.wsgi import application; print('WSGI OK')"
 
+echo "=== Starting Job Worker ==="
+python manage.py run_jobs &
+
 echo "=== Starting Gunicorn ==="
 exec gunicorn sms_project.wsgi:application \
     --bind 0.0.0.0:${PORT:-8080} \
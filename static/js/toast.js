@@ -1,6 +1,5 @@
- 
 // ===== Toast Notification System =====
-function showToast(message, type = 'info', duration = 5000) {
+function showToast(message, type = 'info', duration = 5000, link = '') {
     let container = document.querySelector('.toast-container');
     if (!container) {
         container = document.createElement('div');
@@ -15,10 +14,20 @@ function showToast(message, type = 'info', duration = 5000) {
         info: 'ℹ️'
     };
 
+    // Built with textContent: messages may hold user-entered titles
     const toast = document.createElement('div');
     toast.className = `toast toast-${type}`;
-    toast.innerHTML = `${icons[type] || icons.info} ${message}`;
-    toast.onclick = function() { this.remove(); };
+    const icon = document.createElement('div');
+    icon.className = 'toast-icon';
+    icon.textContent = icons[type] || icons.info;
+    const text = document.createElement('span');
+    text.className = 'toast-message';
+    text.textContent = message;
+    toast.append(icon, text);
+    toast.onclick = function() {
+        if (link) window.location.href = link;
+        this.remove();
+    };
 
     container.appendChild(toast);
 
@@ -28,4 +37,38 @@ function showToast(message, type = 'info', duration = 5000) {
         toast.style.transform = 'translateX(100%)';
         setTimeout(() => toast.remove(), 500);
     }, duration);
-}
\ No newline at end of file
+}
+
+// ===== Live Updates =====
+// Badge links carry data-badge="<counter name>"; the event stream sends
+// the counts that changed and the title of each new activity.
+function setBadge(name, count) {
+    document.querySelectorAll(`[data-badge="${name}"]`).forEach(function(link) {
+        let badge = link.querySelector('.count-badge, .nav-badge');
+        if (count > 0) {
+            if (!badge) {
+                badge = document.createElement('span');
+                badge.className = link.classList.contains('nav-action-btn') ? 'count-badge' : 'nav-badge';
+                link.appendChild(badge);
+            }
+            badge.textContent = count;
+        } else if (badge) {
+            badge.remove();
+        }
+    });
+}
+
+function listenForUpdates(url) {
+    if (!window.EventSource) return;
+
+    const source = new EventSource(url);
+    source.addEventListener('counters', function(e) {
+        const counters = JSON.parse(e.data);
+        Object.keys(counters).forEach(function(name) { setBadge(name, counters[name]); });
+    });
+    source.addEventListener('activity', function(e) {
+        const activity = JSON.parse(e.data);
+        showToast(activity.title, 'info', 5000, activity.link);
+    });
+    return source;
+}
@@ -1,6 +1,6 @@
  
 from django.contrib import admin
-from .models import StudentFile, Student
+from .models import StudentFile, Student, ColumnMappingProfile
 
 
 @admin.register(StudentFile)
@@ -14,4 +14,11 @@ class StudentFileAdmin(admin.ModelAdmin):
 class StudentAdmin(admin.ModelAdmin):
     list_display = ('roll_no', 'prn', 'full_name', 'class_name', 'division', 'status')
     list_filter = ('status', 'class_name', 'division', 'year')
-    search_fields = ('full_name', 'roll_no', 'prn')
\ No newline at end of file
+    search_fields = ('full_name', 'roll_no', 'prn')
+
+
+@admin.register(ColumnMappingProfile)
+class ColumnMappingProfileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'description', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'description')
@@ -0,0 +1,354 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, groupby, islice
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Student
+
+
+# Exports read students this many rows at a time, and keep a finished file
+# in memory up to EXPORT_SPOOL_SIZE bytes before using a temp file.
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_SPOOL_SIZE = 5 * 1024 * 1024
+
+# Threads rendering files for a bulk ZIP export. At most this many rendered
+# files wait to be written to the archive at any time.
+EXPORT_ZIP_WORKERS = 3
+
+
+def _choice_label(choices):
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+# (header, field, formatter) for every exported column, in order. Shared
+# by all export formats so they always agree on columns.
+EXPORT_COLUMNS = (
+    ('Roll No', 'roll_no', None),
+    ('PRN', 'prn', None),
+    ('ABC ID', 'abc_id', None),
+    ('Full Name', 'full_name', None),
+    ('Phone', 'phone', None),
+    ('Email', 'email', None),
+    ('Parent Name', 'parent_name', None),
+    ('Parent Phone', 'parent_phone', None),
+    ('Birthdate', 'birthdate', lambda value: value.strftime('%Y-%m-%d') if value else ''),
+    ('Gender', 'gender', _choice_label(Student.GENDER_CHOICES)),
+    ('Local Address', 'address', None),
+    ('Permanent Address', 'permanent_address', None),
+    ('Class', 'class_name', None),
+    ('Division', 'division', None),
+    ('Year', 'year', None),
+    ('Status', 'status', _choice_label(Student.STATUS_CHOICES)),
+)
+
+
+def iter_export_rows(students, columns=EXPORT_COLUMNS):
+    """Yield formatted value lists for a Student queryset, chunk by chunk."""
+    fields = [field for _, field, _ in columns]
+    formatters = [formatter for _, _, formatter in columns]
+
+    for values in students.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            formatter(value) if formatter else value
+            for formatter, value in zip(formatters, values)
+        ]
+
+
+# ===== FORMAT WRITERS =====
+# Each takes already formatted rows and writes one file to a binary output.
+
+def write_excel(rows, output):
+    """Write rows to a write-only workbook so memory stays flat."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Students')
+    rows = iter(rows)
+
+    # Write-only sheets need column widths before the first row, so they
+    # are sized from the header and the first chunk of rows.
+    head = list(islice(rows, EXPORT_CHUNK_SIZE))
+    widths = [len(header) for header, _, _ in EXPORT_COLUMNS]
+    for row in head:
+        for col_idx, value in enumerate(row):
+            if value is not None:
+                widths[col_idx] = max(widths[col_idx], len(str(value)))
+    for col_idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(width + 2, 40)
+
+    # Bold headers
+    header_cells = []
+    for header, _, _ in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # Data
+    for row in chain(head, rows):
+        ws.append(row)
+
+    wb.save(output)
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chain([[header for header, _, _ in EXPORT_COLUMNS]], rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _ndjson_lines(rows):
+    fields = [field for _, field, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+
+
+def _in_chunks(lines, chunk_rows=500):
+    """Join generated text lines into larger chunks."""
+    lines = iter(lines)
+    while True:
+        chunk = ''.join(islice(lines, chunk_rows))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows, output):
+    for chunk in _in_chunks(_csv_lines(rows)):
+        output.write(chunk.encode('utf-8'))
+
+
+def write_ndjson(rows, output):
+    for chunk in _in_chunks(_ndjson_lines(rows)):
+        output.write(chunk.encode('utf-8'))
+
+
+# format -> (writer, content type, compression inside a ZIP). The ?format=
+# parameter of the download views accepts these keys; xlsx is already
+# compressed, so it is stored as is in archives.
+EXPORT_FORMATS = {
+    'xlsx': (
+        write_excel,
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        zipfile.ZIP_STORED,
+    ),
+    'csv': (write_csv, 'text/csv; charset=utf-8', zipfile.ZIP_DEFLATED),
+    'ndjson': (write_ndjson, 'application/x-ndjson', zipfile.ZIP_DEFLATED),
+}
+
+
+# ===== CACHED FILE DOWNLOADS =====
+# Finished exports are kept under MEDIA_ROOT/export_cache/<file id>/, named
+# after a hash of (file id, format, latest student change, row count). Any
+# change to a file's students gives a new name, and the signals in
+# students/signals.py drop the directory whenever a student is saved or
+# deleted.
+
+EXPORT_CACHE_DIR = 'export_cache'
+
+
+def export_cache_dir(file_id):
+    return os.path.join(settings.MEDIA_ROOT, EXPORT_CACHE_DIR, str(file_id))
+
+
+def invalidate_export_cache(file_id):
+    """Remove every cached export of a file."""
+    shutil.rmtree(export_cache_dir(file_id), ignore_errors=True)
+
+
+def export_cache_key(student_file, fmt):
+    """Return (key, last modified) describing the file's current contents."""
+    state = student_file.students.aggregate(last_change=Max('updated_at'), rows=Count('pk'))
+    last_change = state['last_change']
+    raw = f"{student_file.pk}:{fmt}:{last_change.isoformat() if last_change else ''}:{state['rows']}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32], last_change or student_file.upload_date
+
+
+def cached_export(student_file, fmt, key):
+    """Return the path of the cached export for ``key``, rendering it if needed.
+
+    A new export is written to a temp file and renamed into place, so a
+    concurrent download never reads a half written file. Older exports of
+    the same format are removed at the same time.
+    """
+    directory = export_cache_dir(student_file.pk)
+    path = os.path.join(directory, f'{key}.{fmt}')
+    if os.path.exists(path):
+        return path
+
+    writer = EXPORT_FORMATS[fmt][0]
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            writer(iter_export_rows(student_file.students.all()), output)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # invalidate_export_cache may have removed the directory meanwhile
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    for name in os.listdir(directory):
+        if name.endswith(f'.{fmt}') and name != f'{key}.{fmt}':
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def export_file_response(request, student_file, fmt):
+    """Serve a file's export from the cache, honouring ETag/Last-Modified.
+
+    Only the key query runs when the client already has the current
+    version (304) or the export is cached; the roster is read only when
+    the export has to be rendered.
+    """
+    key, last_modified = export_cache_key(student_file, fmt)
+    etag = f'"{key}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()),
+    )
+    if response is None:
+        response = FileResponse(
+            open(cached_export(student_file, fmt, key), 'rb'),
+            as_attachment=True,
+            filename=f'{student_file.file_name}.{fmt}',
+            content_type=EXPORT_FORMATS[fmt][1],
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+# ===== BULK ZIP EXPORT =====
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink that collects what ZipFile writes until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _archive_names(student_files, fmt):
+    """Unique, path-safe member names for each file in the archive."""
+    names = {}
+    used = set()
+    for student_file in student_files:
+        name = student_file.file_name.replace('/', '-').replace('\\', '-')
+        if name in used:
+            name = f'{name}_{student_file.pk}'
+        used.add(name)
+        names[student_file.pk] = f'{name}.{fmt}'
+    return names
+
+
+def iter_files_zip(student_files, fmt='xlsx', workers=EXPORT_ZIP_WORKERS):
+    """Generate a ZIP archive with one export per StudentFile, piece by piece.
+
+    All students are read with one query ordered by file; each file's rows
+    are rendered by a small thread pool while the archive is written and
+    yielded in file order. Only ``workers`` rendered files are held at once.
+    """
+    writer, _, compression = EXPORT_FORMATS[fmt]
+    student_files = list(student_files)
+    files_by_id = {f.pk: f for f in student_files}
+    names = _archive_names(student_files, fmt)
+
+    columns = (('', 'file_id', None),) + EXPORT_COLUMNS
+    rows = iter_export_rows(
+        Student.objects.filter(file_id__in=files_by_id).order_by('file_id', 'roll_no'),
+        columns,
+    )
+    groups = groupby(rows, key=lambda row: row[0])
+    exported = set()
+
+    def render(file_id, file_rows):
+        output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+        writer((row[1:] for row in file_rows), output)
+        output.seek(0)
+        return file_id, output
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=compression) as archive:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def jobs():
+                for file_id, file_rows in groups:
+                    exported.add(file_id)
+                    yield file_id, list(file_rows)
+                # Files without students still get an (empty) export
+                for file_id in files_by_id:
+                    if file_id not in exported:
+                        yield file_id, []
+
+            for file_id, file_rows in jobs():
+                pending.append(pool.submit(render, file_id, file_rows))
+                if len(pending) < workers:
+                    continue
+                _write_member(archive, names, pending.popleft().result())
+                yield stream.drain()
+
+            while pending:
+                _write_member(archive, names, pending.popleft().result())
+                yield stream.drain()
+
+    # Central directory
+    yield stream.drain()
+
+
+def _write_member(archive, names, rendered):
+    file_id, output = rendered
+    with output, archive.open(names[file_id], 'w') as member:
+        while True:
+            chunk = output.read(64 * 1024)
+            if not chunk:
+                break
+            member.write(chunk)
+
+
+def export_files_zip(student_files, fmt='xlsx', archive_name='student_files'):
+    """Stream several StudentFiles as one ZIP download."""
+    response = StreamingHttpResponse(
+        iter_files_zip(student_files, fmt),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{archive_name}.zip"'
+    return response
@@ -1,5 +1,5 @@
 from django import forms
-from .models import StudentFile, Student
+from .models import StudentFile, Student, ColumnMappingProfile
 
 
 class ExcelUploadForm(forms.Form):
@@ -37,39 +37,54 @@ class ExcelUploadForm(forms.Form):
             'accept': '.xlsx,.xls',
         })
     )
+    mapping_profile = forms.ModelChoiceField(
+        queryset=ColumnMappingProfile.objects.filter(is_active=True),
+        required=False,
+        empty_label='Auto-detect',
+        widget=forms.Select(attrs={'class': 'form-input'})
+    )
+
+
+class ExcelSyncForm(forms.Form):
+    excel_file = forms.FileField(
+        widget=forms.FileInput(attrs={
+            'class': 'form-input',
+            'accept': '.xlsx,.xls',
+        })
+    )
+    mapping_profile = forms.ModelChoiceField(
+        queryset=ColumnMappingProfile.objects.filter(is_active=True),
+        required=False,
+        empty_label='Auto-detect',
+        widget=forms.Select(attrs={'class': 'form-input'})
+    )
+    remove_missing = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Remove students that are not in the new sheet',
+    )
 
 
 class StudentEditForm(forms.ModelForm):
     class Meta:
         model = Student
         fields = [
- 
             'full_name', 'roll_no', 'prn', 'abc_id', 'phone', 'email',
-            'parent_phone', 'birthdate', 'gender', 'address', 
+            'parent_name', 'parent_phone', 'birthdate', 'gender', 'address',
             'permanent_address', 'photo'
- 
-            'full_name', 'roll_no', 'prn', 'phone', 'email',
-            'parent_name', 'parent_phone', 'address', 'photo'
- 
         ]
         widgets = {
             'full_name': forms.TextInput(attrs={'class': 'form-input'}),
             'roll_no': forms.TextInput(attrs={'class': 'form-input'}),
             'prn': forms.TextInput(attrs={'class': 'form-input'}),
- 
             'abc_id': forms.TextInput(attrs={'class': 'form-input'}),
             'phone': forms.TextInput(attrs={'class': 'form-input'}),
             'email': forms.EmailInput(attrs={'class': 'form-input'}),
+            'parent_name': forms.TextInput(attrs={'class': 'form-input'}),
             'parent_phone': forms.TextInput(attrs={'class': 'form-input'}),
             'birthdate': forms.DateInput(attrs={'class': 'form-input', 'type': 'date'}),
             'gender': forms.Select(attrs={'class': 'form-input'}),
             'address': forms.Textarea(attrs={'class': 'form-input', 'rows': 3}),
             'permanent_address': forms.Textarea(attrs={'class': 'form-input', 'rows': 3}),
- 
-            'phone': forms.TextInput(attrs={'class': 'form-input'}),
-            'email': forms.EmailInput(attrs={'class': 'form-input'}),
-            'parent_name': forms.TextInput(attrs={'class': 'form-input'}),
-            'parent_phone': forms.TextInput(attrs={'class': 'form-input'}),
-            'address': forms.Textarea(attrs={'class': 'form-input', 'rows': 3}),
-             'photo': forms.FileInput(attrs={'class': 'form-input'}),
-        }
\ No newline at end of file
+            'photo': forms.FileInput(attrs={'class': 'form-input'}),
+        }
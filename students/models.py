@@ -1,5 +1,3 @@
-   
- 
 from django.db import models
 from django.conf import settings
 
@@ -42,13 +40,13 @@ class Student(models.Model):
         ('marked', 'Edit Marked'),
         ('resolved', 'Resolved'),
     )
-     
+
     GENDER_CHOICES = (
         ('male', 'Male'),
         ('female', 'Female'),
         ('other', 'Other'),
     )
- 
+
     file = models.ForeignKey(
         StudentFile,
         on_delete=models.CASCADE,
@@ -56,18 +54,17 @@ class Student(models.Model):
     )
     roll_no = models.CharField(max_length=10)
     prn = models.CharField(max_length=30)
-     abc_id = models.CharField(max_length=50, blank=True, default='')
-     full_name = models.CharField(max_length=255)
+    abc_id = models.CharField(max_length=50, blank=True, default='')
+    full_name = models.CharField(max_length=255)
     phone = models.CharField(max_length=15, blank=True, default='')
     email = models.EmailField(blank=True, default='')
     parent_name = models.CharField(max_length=255, blank=True, default='')
     parent_phone = models.CharField(max_length=15, blank=True, default='')
-     birthdate = models.DateField(null=True, blank=True)
+    birthdate = models.DateField(null=True, blank=True)
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, blank=True, default='')
     address = models.TextField(blank=True, default='')
     permanent_address = models.TextField(blank=True, default='')
-     address = models.TextField(blank=True, default='')
-     photo = models.ImageField(upload_to='student_photos/', blank=True, null=True)
+    photo = models.ImageField(upload_to='student_photos/', blank=True, null=True)
     class_name = models.CharField(max_length=100)
     division = models.CharField(max_length=10)
     year = models.CharField(max_length=50)
@@ -98,4 +95,44 @@ class Student(models.Model):
                 return (parts[0][0] + parts[-1][0]).upper()
             elif len(parts) == 1:
                 return parts[0][0].upper()
-        return 'S'
\ No newline at end of file
+        return 'S'
+
+
+class ColumnMappingProfile(models.Model):
+    """Extra header spellings for one university's Excel template.
+
+    ``aliases`` maps a student field to the headers that mean it, e.g.
+    ``{"roll_no": ["seat no"], "full_name": ["candidate name"]}``. They are
+    added on top of the built-in aliases in students.utils.HEADER_ALIASES.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    description = models.CharField(max_length=255, blank=True, default='')
+    aliases = models.JSONField(default=dict, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='column_mapping_profiles'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'column_mapping_profiles'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .utils import HEADER_ALIASES
+
+        if not isinstance(self.aliases, dict):
+            raise ValidationError({'aliases': 'Must be an object of field: [headers].'})
+        for field, headers in self.aliases.items():
+            if field not in HEADER_ALIASES:
+                raise ValidationError({'aliases': f'Unknown student field "{field}".'})
+            if not isinstance(headers, list) or not all(isinstance(h, str) for h in headers):
+                raise ValidationError({'aliases': f'Headers for "{field}" must be a list of strings.'})
@@ -0,0 +1,86 @@
+import io
+import multiprocessing
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.template.loader import get_template
+
+
+PROFILE_TEMPLATE = 'students/student_pdf.html'
+
+
+def html_to_pdf(html):
+    """Convert rendered HTML to PDF bytes, or None if xhtml2pdf fails.
+
+    Runs in the worker processes, so it must not touch Django.
+    """
+    from xhtml2pdf import pisa
+
+    result = io.BytesIO()
+    pdf = pisa.CreatePDF(io.BytesIO(html.encode('utf-8')), dest=result)
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
+def profile_pdf_name(student):
+    name = f'{student.roll_no}_{student.full_name}_Profile.pdf'
+    return name.replace('/', '-').replace('\\', '-')
+
+
+def render_student_pdf(student):
+    """Render one student profile to PDF bytes (None on failure)."""
+    return html_to_pdf(get_template(PROFILE_TEMPLATE).render({'student': student}))
+
+
+def render_student_pdfs(students, workers=None):
+    """Yield (student, pdf bytes or None) for each student, in order.
+
+    The template is compiled once and rendered to HTML here; the HTML to
+    PDF conversion, which is the slow part, runs in a pool of ``workers``
+    processes (PDF_WORKERS by default). Only a few pages per worker are
+    queued at a time, so memory stays flat for large files.
+    """
+    template = get_template(PROFILE_TEMPLATE)
+    workers = workers or settings.PDF_WORKERS
+
+    if workers <= 1:
+        for student in students:
+            yield student, html_to_pdf(template.render({'student': student}))
+        return
+
+    # spawn, not fork: the parent may have open DB connections and threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for student in students:
+            html = template.render({'student': student})
+            pending.append((student, pool.submit(html_to_pdf, html)))
+            if len(pending) >= workers * 4:
+                student, future = pending.popleft()
+                yield student, future.result()
+
+        while pending:
+            student, future = pending.popleft()
+            yield student, future.result()
+
+
+def write_merged_pdf(rendered, output):
+    """Write rendered profiles as one PDF, in order."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for _, pdf in rendered:
+        if pdf:
+            writer.append(PdfReader(io.BytesIO(pdf)))
+    writer.write(output)
+
+
+def write_pdf_zip(rendered, output):
+    """Write rendered profiles as a ZIP with one PDF per student."""
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for student, pdf in rendered:
+            if pdf:
+                archive.writestr(profile_pdf_name(student), pdf)
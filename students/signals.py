@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from reports.snapshots import in_bulk_change
+from .exports import invalidate_export_cache
+from .models import Student, StudentFile
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def drop_student_exports(sender, instance, **kwargs):
+    """Edits and deletes (student_edit, student_delete) change the export.
+
+    Bulk changes (file_delete, syncs, file cascades) drop it once instead.
+    """
+    if not in_bulk_change(instance.file_id):
+        invalidate_export_cache(instance.file_id)
+
+
+@receiver(post_delete, sender=StudentFile)
+def drop_file_exports(sender, instance, **kwargs):
+    invalidate_export_cache(instance.pk)
@@ -0,0 +1,173 @@
+import tempfile
+
+from django.core.files import File
+from django.urls import reverse
+
+from accounts.utils import log_action
+from jobs.models import Job
+from jobs.utils import on_abandoned, register, MAX_JOB_ERRORS
+from reports.metrics import invalidate_stats
+from reports.snapshots import bulk_student_changes, rebuild_student_rollup
+from .exports import invalidate_export_cache
+from .models import StudentFile, ColumnMappingProfile
+from .pdfs import render_student_pdfs, write_merged_pdf, write_pdf_zip
+from .utils import (
+    ExcelImportError, count_rejected, read_excel_students, import_students, sync_students,
+)
+
+
+def _mapping_profiles(data):
+    """A chosen profile is the only candidate; otherwise every active one competes."""
+    profiles = ColumnMappingProfile.objects.filter(is_active=True)
+    if data.get('profile_id'):
+        profiles = profiles.filter(pk=data['profile_id'])
+    return list(profiles)
+
+
+@register('student_import')
+def import_excel_job(job):
+    """Import an uploaded Excel sheet into a new StudentFile."""
+    data = job.payload
+    errors = []
+
+    def report(inserted):
+        job.set_progress(
+            parsed=inserted + count_rejected(errors),
+            inserted=inserted,
+            rejected=count_rejected(errors),
+        )
+
+    report(0)
+
+    with job.input_file.open('rb') as excel_file:
+        profile, students_data = read_excel_students(excel_file, errors, _mapping_profiles(data))
+
+        # The file stays hidden from file lists until every row is in.
+        student_file = StudentFile.objects.create(
+            file_name=data['file_name'],
+            class_name=data['class_name'],
+            division=data['division'],
+            year=data['year'],
+            academic_year=data['academic_year'],
+            excel_file=job.input_file.name,
+            uploaded_by=job.created_by,
+            is_active=False,
+        )
+        # Lets the clean-up find it if the worker dies mid-import
+        job.payload['student_file_id'] = student_file.pk
+        Job.objects.filter(pk=job.pk).update(payload=job.payload)
+        try:
+            imported = import_students(student_file, students_data, on_batch=report)
+        except Exception:
+            student_file.delete()
+            raise
+
+    report(imported)
+    job.errors = errors[:MAX_JOB_ERRORS]
+
+    if not imported:
+        student_file.delete()
+        raise ExcelImportError('No student rows found in the Excel file.')
+
+    # bulk_create sends no signals
+    rebuild_student_rollup(student_file.pk)
+    invalidate_stats('students')
+
+    student_file.total_students = imported
+    student_file.is_active = True
+    student_file.save(update_fields=['total_students', 'is_active'])
+    job.result_url = reverse('student_list', args=[student_file.pk])
+
+    mapping = profile.name if profile else 'default'
+    log_action(job.created_by, 'file_upload', None,
+               f'Uploaded {student_file.file_name} with {imported} students (column mapping: {mapping})')
+
+
+@on_abandoned('student_import')
+def discard_abandoned_import(job):
+    """Drop the hidden, half-imported file of an import whose worker died."""
+    file_id = job.payload.get('student_file_id')
+    if file_id:
+        StudentFile.objects.filter(pk=file_id, is_active=False).delete()
+
+
+@register('student_sync')
+def sync_excel_job(job):
+    """Apply a re-uploaded Excel sheet to an existing StudentFile."""
+    data = job.payload
+    student_file = StudentFile.objects.get(pk=data['student_file_id'], is_active=True)
+    errors = []
+
+    def report(stats):
+        job.set_progress(
+            parsed=stats['created'] + stats['updated'] + stats['unchanged'] + count_rejected(errors),
+            inserted=stats['created'],
+            updated=stats['updated'],
+            deleted=stats['deleted'],
+            rejected=count_rejected(errors),
+        )
+
+    with job.input_file.open('rb') as excel_file:
+        profile, students_data = read_excel_students(excel_file, errors, _mapping_profiles(data))
+        try:
+            with bulk_student_changes(student_file.pk):
+                stats = sync_students(
+                    student_file, students_data,
+                    remove_missing=data.get('remove_missing', True),
+                    on_batch=report,
+                )
+        finally:
+            job.errors = errors[:MAX_JOB_ERRORS]
+
+    report(stats)
+    # bulk_update/bulk_create send no signals
+    invalidate_export_cache(student_file.pk)
+    invalidate_stats('students')
+
+    student_file.total_students = student_file.students.count()
+    student_file.excel_file = job.input_file.name
+    student_file.save(update_fields=['total_students', 'excel_file'])
+    job.result_url = reverse('student_list', args=[student_file.pk])
+
+    log_action(job.created_by, 'file_upload', None,
+               f'Synced {student_file.file_name}: {stats["created"]} added, '
+               f'{stats["updated"]} updated, {stats["deleted"]} removed, '
+               f'{stats["unchanged"]} unchanged')
+
+
+@register('student_pdfs')
+def profile_pdfs_job(job):
+    """Render profile PDFs for a file (or selected students) into one download."""
+    data = job.payload
+    student_file = StudentFile.objects.get(pk=data['student_file_id'])
+    students = student_file.students.select_related('file')
+    if data.get('student_ids'):
+        students = students.filter(pk__in=data['student_ids'])
+
+    total = students.count()
+    if not total:
+        raise ValueError('No students selected.')
+    errors = []
+
+    def tracked(rendered):
+        for count, (student, pdf) in enumerate(rendered, 1):
+            if pdf is None:
+                errors.append(f'Could not render profile of {student.roll_no} {student.full_name}')
+            if count % 10 == 0 or count == total:
+                job.set_progress(total=total, rendered=count, rejected=len(errors))
+            yield student, pdf
+
+    job.set_progress(total=total, rendered=0, rejected=0)
+    rendered = tracked(render_student_pdfs(students.iterator()))
+
+    merge = data.get('merge', True)
+    writer, extension = (write_merged_pdf, 'pdf') if merge else (write_pdf_zip, 'zip')
+    with tempfile.TemporaryFile() as output:
+        writer(rendered, output)
+        job.errors = errors[:MAX_JOB_ERRORS]
+        if len(errors) == total:
+            raise ValueError('No profile could be rendered.')
+        output.seek(0)
+        job.result_file.save(f'{student_file.file_name}_profiles.{extension}', File(output), save=False)
+
+    job.result_url = reverse('job_result', args=[job.pk])
@@ -1,73 +1,238 @@
+import re
+from itertools import islice
+
 import openpyxl
-from io import BytesIO
-from django.http import HttpResponse
 
+from .validators import INVALID, cell_text, column_normalizers, normalize_text
+
+
+# Rows are handed to bulk_create in batches of this size so a large sheet
+# never has more than one batch of Student objects in memory at once.
+IMPORT_BATCH_SIZE = 500
+
+# Built-in header spellings for each student field, in order of preference.
+# Headers are compared after normalize_header(), so case, underscores and
+# trailing dots do not matter. ColumnMappingProfile adds to these.
+HEADER_ALIASES = {
+    'roll_no': ('roll no', 'rollno', 'roll', 'student roll no'),
+    'prn': ('prn', 'prn no'),
+    'abc_id': ('abc id',),
+    'full_name': ('full name', 'name', 'student name', 'student full name'),
+    'phone': ('phone', 'phone no', 'mobile', 'contact number (student)'),
+    'email': ('email', 'email id'),
+    'parent_name': ('parent name', 'guardian name'),
+    'parent_phone': ('parent phone', 'parent mobile', 'parent contact number (father)'),
+    'birthdate': ('birthdate', 'birth date', 'dob'),
+    'gender': ('gender',),
+    'address': ('address', 'local address'),
+    'permanent_address': ('permanent address',),
+}
+
+REQUIRED_FIELDS = ('roll_no', 'full_name')
+
+
+class ExcelImportError(Exception):
+    """Raised when an uploaded sheet cannot be imported at all."""
+
+
+class RowWarning(str):
+    """An ``errors`` entry about a row that was still imported."""
+
+
+def count_rejected(errors):
+    """Number of rows left out, from the ``errors`` of an upload."""
+    return sum(not isinstance(error, RowWarning) for error in errors)
+
+
+# Compiled alias indexes, keyed by (profile pk, updated_at); None is the
+# built-in index. Saving a profile changes its key, so edits are picked up.
+_alias_index_cache = {}
+
+
+def normalize_header(header):
+    """Normalize a header cell for alias lookup ('Roll_No.' -> 'roll no')."""
+    if header is None:
+        return ''
+    return re.sub(r'[\s_]+', ' ', str(header).lower()).strip(' .:')
+
+
+def compile_alias_index(aliases):
+    """Build {normalized header: (field, rank)} from {field: [headers]}.
+
+    ``rank`` is the alias position, so when a sheet has two headers for
+    the same field the more preferred one wins.
+    """
+    index = {}
+    for field, headers in aliases.items():
+        for rank, header in enumerate(headers):
+            index.setdefault(normalize_header(header), (field, rank))
+    return index
 
-def parse_excel(file):
-    """Parse uploaded Excel file and return list of student dicts."""
+
+def get_alias_index(profile=None):
+    """Return the compiled alias index for a profile (None = built-in only)."""
+    key = (profile.pk, profile.updated_at) if profile else None
+    index = _alias_index_cache.get(key)
+    if index is None:
+        aliases = {field: list(headers) for field, headers in HEADER_ALIASES.items()}
+        if profile:
+            for field, headers in profile.aliases.items():
+                # Profile spellings take precedence over the built-in ones
+                aliases[field] = list(headers) + aliases.get(field, [])
+            for cached in [k for k in _alias_index_cache if k and k[0] == profile.pk]:
+                del _alias_index_cache[cached]
+        index = compile_alias_index(aliases)
+        _alias_index_cache[key] = index
+    return index
+
+
+def resolve_columns(headers, index=None):
+    """Map each student field to the index of its column in the header row.
+
+    One pass over the (already normalized) headers; fields with no matching
+    header are left out.
+    """
+    if index is None:
+        index = get_alias_index()
+
+    columns = {}
+    ranks = {}
+    for col_idx, header in enumerate(headers):
+        match = index.get(header)
+        if match:
+            field, rank = match
+            if field not in ranks or rank < ranks[field]:
+                columns[field] = col_idx
+                ranks[field] = rank
+    return columns
+
+
+def match_profile(header_row, profiles=()):
+    """Pick the mapping profile that best fits a header row.
+
+    Profiles are scored by whether they cover the required fields, then by
+    how many columns they recognise. Returns (profile, columns); profile is
+    None when the built-in aliases do at least as well.
+    """
+    headers = [normalize_header(cell) for cell in header_row]
+
+    def score(columns):
+        return (all(f in columns for f in REQUIRED_FIELDS), len(columns))
+
+    best_profile, best_columns = None, resolve_columns(headers)
+    for profile in profiles:
+        columns = resolve_columns(headers, get_alias_index(profile))
+        if score(columns) > score(best_columns):
+            best_profile, best_columns = profile, columns
+    return best_profile, best_columns
+
+
+def read_excel_students(file, errors, profiles=()):
+    """Open an uploaded Excel file and stream validated student dicts from it.
+
+    The header row is matched against the built-in aliases and ``profiles``
+    once, then the sheet is read in a single pass and run through
+    clean_students(). Rows that fail validation are appended to ``errors``
+    instead of being yielded. Returns
+    (profile, rows) where profile is the ColumnMappingProfile used, if any.
+    Raises ExcelImportError if the sheet has no usable header row.
+    """
     try:
-        wb = openpyxl.load_workbook(file, read_only=True)
-        ws = wb.active
-
-        students = []
-        errors = []
-        headers = []
-         header_row_idx = None
-
-        # Find header row (first non-empty row)
-        for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-            if any(row):  # Found first non-empty row
-                headers = [str(cell).strip().lower() if cell else '' for cell in row]
-                header_row_idx = row_idx
-                break
-
-        if not header_row_idx:
-            return [], ['Excel file is empty or has no headers']
-
-        # Process data rows
-        for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-            # Skip until after header row
-            if row_idx <= header_row_idx:
- 
-        for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-            if row_idx == 1:
-                # Header row - map column names
-                headers = [str(cell).strip().lower() if cell else '' for cell in row]
-                 continue
+        wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ExcelImportError(f'Error reading Excel file: {str(e)}')
+
+    rows = enumerate(wb.active.iter_rows(values_only=True), 1)
+
+    # Find header row (first non-empty row)
+    columns = None
+    for row_idx, row in rows:
+        if any(row):
+            profile, columns = match_profile(row, profiles)
+            break
+
+    if columns is None:
+        wb.close()
+        raise ExcelImportError('Excel file is empty or has no headers')
 
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        wb.close()
+        raise ExcelImportError(
+            'Missing required column(s): ' + ', '.join(missing).replace('_', ' ')
+        )
+
+    # Without a PRN column rows carry no 'prn' (see with_prn)
+    fields = [f for f in HEADER_ALIASES if f in columns]
+    return profile, clean_students(_iter_rows(wb, rows, columns), errors, fields)
+
+
+def _iter_rows(wb, rows, columns):
+    """Yield (row number, {field: native cell value}) for non-empty rows."""
+    try:
+        for row_idx, row in rows:
             # Skip empty rows
             if not any(row):
                 continue
 
-            # Map row data to dict using headers
-            row_data = {}
-            for col_idx, value in enumerate(row):
-                if col_idx < len(headers):
-                    row_data[headers[col_idx]] = str(value).strip() if value else ''
-
-            # Extract student data - flexible header matching
-            student = {
-                 'roll_no': row_data.get('roll_no', row_data.get('roll no', row_data.get('rollno', row_data.get('roll', row_data.get('student roll no', ''))))),
-                'prn': row_data.get('prn', row_data.get('prn no', row_data.get('prn_no', row_data.get('prn no.', '')))),
-                'abc_id': row_data.get('abc_id', row_data.get('abc id', '')),
-                'full_name': row_data.get('full_name', row_data.get('name', row_data.get('full name', row_data.get('student name', row_data.get('student full name', ''))))),
-                'phone': row_data.get('phone', row_data.get('phone no', row_data.get('mobile', row_data.get('phone_no', row_data.get('contact number (student)', ''))))),
-                'email': row_data.get('email', row_data.get('email id', row_data.get('email_id', ''))),
-                'parent_name': row_data.get('parent_name', row_data.get('parent name', row_data.get('guardian name', ''))),
-                'parent_phone': row_data.get('parent_phone', row_data.get('parent phone', row_data.get('parent mobile', row_data.get('parent contact number (father)', '')))),
-                'birthdate': row_data.get('birthdate', row_data.get('birth date', row_data.get('dob', ''))),
-                'gender': row_data.get('gender', '').strip().lower() if row_data.get('gender', '').strip() else '',
-                'address': row_data.get('address', row_data.get('local address', '')),
-                'permanent_address': row_data.get('permanent_address', row_data.get('permanent address', '')),
-                 'roll_no': row_data.get('roll_no', row_data.get('roll no', row_data.get('rollno', row_data.get('roll', '')))),
-                'prn': row_data.get('prn', row_data.get('prn no', row_data.get('prn_no', ''))),
-                'full_name': row_data.get('full_name', row_data.get('name', row_data.get('full name', row_data.get('student name', '')))),
-                'phone': row_data.get('phone', row_data.get('phone no', row_data.get('mobile', row_data.get('phone_no', '')))),
-                'email': row_data.get('email', row_data.get('email id', row_data.get('email_id', ''))),
-                'parent_name': row_data.get('parent_name', row_data.get('parent name', row_data.get('guardian name', ''))),
-                'parent_phone': row_data.get('parent_phone', row_data.get('parent phone', row_data.get('parent mobile', ''))),
-                'address': row_data.get('address', ''),
-             }
+            width = len(row)
+            yield row_idx, {
+                field: row[idx] for field, idx in columns.items() if idx < width
+            }
+    finally:
+        wb.close()
+
+
+def clean_students(rows, errors, fields=None, batch_size=IMPORT_BATCH_SIZE):
+    """Normalize and validate raw sheet rows a batch at a time.
+
+    Each batch is converted column by column (dates, phones, genders,
+    emails) with converters that keep their state for the whole upload.
+    Rows with a bad roll number or name are rejected; bad optional values
+    are left blank with a RowWarning. Both are reported in ``errors``. The
+    rows are yielded as student dicts holding ``fields`` (default: every
+    importable field), ready for import_students or sync_students.
+    """
+    from .models import Student
+
+    fields = list(fields or HEADER_ALIASES)
+    max_lengths = {
+        f.name: f.max_length for f in Student._meta.fields
+        if f.name in fields and f.max_length
+    }
+    blanks = {f.name: None if f.null else '' for f in Student._meta.fields if f.name in fields}
+    normalizers = column_normalizers()
+    seen_roll_nos = set()
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        columns = {
+            field: normalizers.get(field, normalize_text)([raw.get(field) for _, raw in batch])
+            for field in fields
+        }
+
+        for i, (row_idx, raw) in enumerate(batch):
+            student = {field: values[i] for field, values in columns.items()}
+
+            invalid = [field for field, value in student.items() if value is INVALID]
+            invalid += [
+                field for field, limit in max_lengths.items()
+                if field not in invalid and len(student[field]) > limit
+            ]
+            if invalid:
+                message = f'Row {row_idx}: Invalid ' + ', '.join(
+                    f"{field.replace('_', ' ')} '{cell_text(raw.get(field))}'" for field in invalid
+                )
+                if any(field in REQUIRED_FIELDS for field in invalid):
+                    errors.append(message)
+                    continue
+                errors.append(RowWarning(message + ' left blank'))
+                for field in invalid:
+                    student[field] = blanks[field]
 
             # Validate required fields
             if not student['roll_no']:
@@ -76,74 +241,153 @@ def parse_excel(file):
             if not student['full_name']:
                 errors.append(f'Row {row_idx}: Missing student name')
                 continue
+            if student['roll_no'] in seen_roll_nos:
+                errors.append(f'Row {row_idx}: Duplicate roll number {student["roll_no"]}')
+                continue
+            seen_roll_nos.add(student['roll_no'])
 
             # Generate PRN if missing
-            if not student['prn']:
-                student['prn'] = f'PRN-{student["roll_no"]}'
+            if 'prn' in student and not student['prn']:
+                student['prn'] = default_prn(student['roll_no'])
 
-            students.append(student)
+            yield student
 
-        wb.close()
-        return students, errors
 
-    except Exception as e:
-        return [], [f'Error reading Excel file: {str(e)}']
-
-
-def export_students_excel(students, file_name='students'):
-    """Export student list as Excel file."""
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Students'
-
-    # Headers
-     headers = ['Roll No', 'PRN', 'ABC ID', 'Full Name', 'Phone', 'Email',
-               'Parent Phone', 'Birthdate', 'Gender', 'Local Address',
-               'Permanent Address', 'Class', 'Division', 'Year', 'Status']
-     headers = ['Roll No', 'PRN', 'Full Name', 'Phone', 'Email',
-               'Parent Name', 'Parent Phone', 'Address', 'Class',
-               'Division', 'Year', 'Status']
-     ws.append(headers)
-
-    # Bold headers
-    for cell in ws[1]:
-        cell.font = openpyxl.styles.Font(bold=True)
-
-    # Data
-    for student in students:
-        ws.append([
-            student.roll_no,
-            student.prn,
-             student.abc_id,
-            student.full_name,
-            student.phone,
-            student.email,
-            student.parent_phone,
-            student.birthdate.strftime('%Y-%m-%d') if student.birthdate else '',
-            student.get_gender_display(),
-            student.address,
-            student.permanent_address,
- 
-            student.full_name,
-            student.phone,
-            student.email,
-            student.parent_name,
-            student.parent_phone,
-            student.address,
-             student.class_name,
-            student.division,
-            student.year,
-            student.get_status_display(),
-        ])
-
-    # Auto-width columns
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value or '')) for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = min(length + 2, 40)
-
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{file_name}.xlsx"'
-    wb.save(response)
-    return response
\ No newline at end of file
+def default_prn(roll_no):
+    return f'PRN-{roll_no}'
+
+
+def with_prn(student):
+    """The student dict, with a generated PRN if the sheet had none."""
+    if student.get('prn'):
+        return student
+    return dict(student, prn=default_prn(student['roll_no']))
+
+
+def import_students(student_file, students, batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """Insert student dicts for a file with batched bulk_create.
+
+    ``students`` may be any iterable (typically from read_excel_students); it is
+    consumed ``batch_size`` rows at a time. ``on_batch`` is called with the
+    running total after each batch. Returns the number of rows saved.
+    """
+    from .models import Student
+
+    students = iter(students)
+    total = 0
+    while True:
+        batch = [
+            Student(
+                file=student_file,
+                class_name=student_file.class_name,
+                division=student_file.division,
+                year=student_file.year,
+                **with_prn(data)
+            )
+            for data in islice(students, batch_size)
+        ]
+        if not batch:
+            return total
+        Student.objects.bulk_create(batch)
+        total += len(batch)
+        if on_batch:
+            on_batch(total)
+
+
+def sync_students(student_file, students, remove_missing=True,
+                  batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """Apply a re-uploaded sheet to an existing file, touching only changed rows.
+
+    Incoming rows are matched to existing students on PRN when the sheet has
+    a PRN column, so renumbered students keep their record, and on roll
+    number otherwise. Only the fields present in the rows are compared (a
+    sheet without PRNs leaves the stored ones alone). Changed rows go through
+    bulk_update, new rows through bulk_create and, with ``remove_missing``,
+    students absent from the sheet are deleted, all in one transaction.
+    ``on_batch`` gets the running counts every ``batch_size`` rows.
+
+    Returns a dict of created/updated/deleted/unchanged counts.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import Student
+
+    by_roll_no = {}
+    by_prn = {}
+    for current in student_file.students.values('pk', *HEADER_ALIASES):
+        by_roll_no[current['roll_no']] = current
+        by_prn.setdefault(current['prn'], []).append(current)
+
+    now = timezone.now()
+    matched = set()
+    sheet_roll_nos = set()
+    to_create = []
+    to_update = []
+    # Students changing roll number first move to a placeholder, so that
+    # shifted numbers don't collide with each other mid-update
+    renumbered = []
+    changed_fields = set()
+    stats = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    for count, data in enumerate(students, 1):
+        sheet_roll_nos.add(data['roll_no'])
+        if 'prn' in data:
+            candidates = by_prn.get(data['prn'], [])
+        else:
+            candidates = [by_roll_no[data['roll_no']]] if data['roll_no'] in by_roll_no else []
+        current = next((c for c in candidates if c['pk'] not in matched), None)
+
+        if current is None:
+            to_create.append(Student(
+                file=student_file,
+                class_name=student_file.class_name,
+                division=student_file.division,
+                year=student_file.year,
+                **with_prn(data)
+            ))
+        else:
+            matched.add(current['pk'])
+            changes = [field for field, value in data.items() if current[field] != value]
+            if changes:
+                changed_fields.update(changes)
+                to_update.append(Student(pk=current['pk'], updated_at=now, **data))
+                if 'roll_no' in changes:
+                    renumbered.append(Student(pk=current['pk'], roll_no=f'~{current["pk"]}'))
+            else:
+                stats['unchanged'] += 1
+
+        if on_batch and count % batch_size == 0:
+            on_batch(dict(stats, created=len(to_create), updated=len(to_update)))
+
+    if not matched and not to_create:
+        raise ExcelImportError('No student rows found in the Excel file.')
+
+    missing = [s for s in by_roll_no.values() if s['pk'] not in matched]
+    if not remove_missing:
+        taken = sorted(s['roll_no'] for s in missing if s['roll_no'] in sheet_roll_nos)
+        if taken:
+            raise ExcelImportError(
+                'Roll number(s) ' + ', '.join(taken) + ' still belong to students missing from the '
+                'sheet. Remove those students first, or tick "Remove students that are not in the new sheet".'
+            )
+
+    with transaction.atomic():
+        if remove_missing:
+            missing = [s['pk'] for s in missing]
+            for start in range(0, len(missing), batch_size):
+                Student.objects.filter(pk__in=missing[start:start + batch_size]).delete()
+            stats['deleted'] = len(missing)
+        if renumbered:
+            Student.objects.bulk_update(renumbered, ['roll_no'], batch_size=batch_size)
+        if to_update:
+            Student.objects.bulk_update(
+                to_update, sorted(changed_fields) + ['updated_at'], batch_size=batch_size
+            )
+        if to_create:
+            Student.objects.bulk_create(to_create, batch_size=batch_size)
+
+    stats['created'] = len(to_create)
+    stats['updated'] = len(to_update)
+    if on_batch:
+        on_batch(dict(stats))
+    return stats
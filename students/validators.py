@@ -1 +1,123 @@
- 
+import re
+from datetime import date, datetime
+
+from openpyxl.utils.datetime import from_excel
+
+
+# Returned in place of a value that could not be normalized.
+INVALID = object()
+
+MAX_EXCEL_SERIAL = 2958465  # 31 Dec 9999
+
+DATE_FORMATS = (
+    '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y',
+    '%d %b %Y', '%d-%b-%Y', '%d %B %Y', '%Y/%m/%d',
+)
+
+GENDER_MAP = {
+    'male': 'male', 'm': 'male', 'boy': 'male',
+    'female': 'female', 'f': 'female', 'girl': 'female',
+    'other': 'other', 'o': 'other', 'others': 'other', 'transgender': 'other',
+}
+
+PHONE_SEPARATORS = re.compile(r'[/,;]')
+PHONE_JUNK = re.compile(r'[^\d+]')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def cell_text(value):
+    """Render a cell value as stripped text (whole floats lose their '.0')."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def normalize_text(values):
+    return [cell_text(v) for v in values]
+
+
+def normalize_genders(values):
+    genders = []
+    for value in values:
+        text = cell_text(value).lower()
+        genders.append(GENDER_MAP.get(text, INVALID) if text else '')
+    return genders
+
+
+def normalize_emails(values):
+    emails = []
+    for value in values:
+        text = cell_text(value).lower()
+        emails.append(text if not text or EMAIL_RE.match(text) else INVALID)
+    return emails
+
+
+def normalize_phones(values):
+    """Keep digits (and a leading +) of the first number in each cell."""
+    phones = []
+    for value in values:
+        text = PHONE_SEPARATORS.split(cell_text(value), 1)[0]
+        phone = PHONE_JUNK.sub('', text)
+        if phone and not (7 <= len(phone.lstrip('+')) and len(phone) <= 15):
+            phone = INVALID
+        phones.append(phone)
+    return phones
+
+
+class DateColumn:
+    """Converts a date column, remembering which text format it uses.
+
+    Native dates and Excel serial numbers are converted directly. For text
+    the format that last matched is tried first, so a consistent column
+    only pays for format detection once.
+    """
+
+    def __init__(self):
+        self.format = None
+
+    def __call__(self, values):
+        return [self.convert(v) for v in values]
+
+    def convert(self, value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if 0 < value <= MAX_EXCEL_SERIAL:
+                return from_excel(value).date()
+            return INVALID
+
+        text = str(value).strip()
+        if not text:
+            return None
+        if self.format:
+            try:
+                return datetime.strptime(text, self.format).date()
+            except ValueError:
+                pass
+        for fmt in DATE_FORMATS:
+            if fmt == self.format:
+                continue
+            try:
+                parsed = datetime.strptime(text, fmt).date()
+            except ValueError:
+                continue
+            self.format = fmt
+            return parsed
+        return INVALID
+
+
+def column_normalizers():
+    """Fresh per-upload converters for the columns that need more than text."""
+    return {
+        'birthdate': DateColumn(),
+        'gender': normalize_genders,
+        'email': normalize_emails,
+        'phone': normalize_phones,
+        'parent_phone': normalize_phones,
+    }
@@ -4,16 +4,32 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, Http404
 from django.conf import settings
 from django.db.models import Q
- from datetime import datetime
- 
+from django.urls import reverse
+
 from accounts.decorators import admin_required, role_required
 from accounts.utils import log_action
+from jobs.models import Job
+from jobs.utils import enqueue
+from permissions_app.access import accessible_file_ids, accessible_files, can_access
+from reports.metrics import invalidate_stats
+from reports.snapshots import bulk_student_changes
 from .models import StudentFile, Student
-from .forms import ExcelUploadForm, StudentEditForm
-from .utils import parse_excel, export_students_excel
+from .forms import ExcelUploadForm, ExcelSyncForm, StudentEditForm
+from .pdfs import render_student_pdf
+from .exports import EXPORT_FORMATS, export_file_response, export_files_zip, invalidate_export_cache
+
+
+def excel_upload_error(excel_file):
+    """Return an error message if an uploaded sheet is not acceptable."""
+    ext = os.path.splitext(excel_file.name)[1].lower()
+    if ext not in settings.ALLOWED_EXCEL_EXTENSIONS:
+        return 'Only .xlsx and .xls files are allowed.'
+    if excel_file.size > settings.MAX_UPLOAD_SIZE:
+        return 'File size exceeds 10MB limit.'
+    return None
 
 
 @login_required
@@ -31,106 +47,99 @@ def upload_excel(request):
             year = form.cleaned_data['year']
             academic_year = form.cleaned_data['academic_year']
             excel_file = form.cleaned_data['excel_file']
+            mapping_profile = form.cleaned_data['mapping_profile']
 
-            # Validate file extension
-            ext = os.path.splitext(excel_file.name)[1].lower()
-            if ext not in settings.ALLOWED_EXCEL_EXTENSIONS:
-                messages.error(request, 'Only .xlsx and .xls files are allowed.')
+            error = excel_upload_error(excel_file)
+            if error:
+                messages.error(request, error)
                 return render(request, 'students/upload_excel.html', {'form': form})
 
-            # Validate file size
-            if excel_file.size > settings.MAX_UPLOAD_SIZE:
-                messages.error(request, 'File size exceeds 10MB limit.')
-                return render(request, 'students/upload_excel.html', {'form': form})
-
-            # Check for duplicate
+            # Check for duplicate (including imports still in the queue)
             if StudentFile.objects.filter(
                 class_name=class_name,
                 division=division,
                 year=year,
                 academic_year=academic_year,
                 is_active=True
+            ).exists() or Job.objects.filter(
+                kind='student_import',
+                status__in=('pending', 'running'),
+                payload__class_name=class_name,
+                payload__division=division,
+                payload__year=year,
+                payload__academic_year=academic_year,
             ).exists():
-                messages.error(request, 'A file for this class/division/year/academic year already exists.')
-                return render(request, 'students/upload_excel.html', {'form': form})
-
-            # Parse Excel
-            students_data, errors = parse_excel(excel_file)
-
-            if not students_data and errors:
-                for error in errors:
-                    messages.error(request, error)
+                messages.error(request, 'A file for this class/division/year/academic year already exists. '
+                                        'Use "Re-upload" on that file to sync changes.')
                 return render(request, 'students/upload_excel.html', {'form': form})
 
             # Generate file name
             file_name = f"{year}_{division}_{class_name}_{academic_year}"
 
-            # Create StudentFile
-            student_file = StudentFile.objects.create(
-                file_name=file_name,
-                class_name=class_name,
-                division=division,
-                year=year,
-                academic_year=academic_year,
-                excel_file=excel_file,
-                uploaded_by=request.user,
-                total_students=len(students_data),
-            )
-
-            # Create Students
-            student_objects = []
-            for data in students_data:
-                 # Parse birthdate if present
-                birthdate_value = None
-                if data.get('birthdate'):
-                    try:
-                        birthdate_value = datetime.strptime(data['birthdate'], '%Y-%m-%d').date()
-                    except:
-                        pass
-                
- 
-                student_objects.append(Student(
-                    file=student_file,
-                    roll_no=data['roll_no'],
-                    prn=data['prn'],
-                     abc_id=data.get('abc_id', ''),
-                    full_name=data['full_name'],
-                    phone=data.get('phone', ''),
-                    email=data.get('email', ''),
-                    parent_name=data.get('parent_name', ''),
-                    parent_phone=data.get('parent_phone', ''),
-                    birthdate=birthdate_value,
-                    gender=data.get('gender', '').strip().lower() if data.get('gender', '') else '',
-                    address=data.get('address', ''),
-                    permanent_address=data.get('permanent_address', ''),
-                     full_name=data['full_name'],
-                    phone=data['phone'],
-                    email=data['email'],
-                    parent_name=data['parent_name'],
-                    parent_phone=data['parent_phone'],
-                    address=data['address'],
-                     class_name=class_name,
-                    division=division,
-                    year=year,
-                ))
-
-            Student.objects.bulk_create(student_objects)
-
-            log_action(request.user, 'file_upload', request,
-                       f'Uploaded {file_name} with {len(students_data)} students')
-
-            success_msg = f'File uploaded successfully! {len(students_data)} students imported.'
-            if errors:
-                success_msg += f' ({len(errors)} rows skipped)'
-            messages.success(request, success_msg)
-
-            if errors:
-                for error in errors[:5]:  # Show max 5 errors
-                    messages.warning(request, error)
-
-            return redirect('file_list')
-
-    return render(request, 'students/upload_excel.html', {'form': form})
+            # Hand the sheet to the background worker
+            job = enqueue('student_import', payload={
+                'file_name': file_name,
+                'class_name': class_name,
+                'division': division,
+                'year': year,
+                'academic_year': academic_year,
+                'profile_id': mapping_profile.pk if mapping_profile else None,
+            }, created_by=request.user, input_file=excel_file)
+
+            messages.info(request, f'Upload received. Importing {file_name} in the background...')
+            return redirect(f"{reverse('upload_excel')}?job={job.pk}")
+
+    job = None
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = Job.objects.filter(pk=job_id, kind='student_import').first()
+
+    return render(request, 'students/upload_excel.html', {'form': form, 'job': job})
+
+
+@login_required
+@admin_required
+def file_sync(request, file_id):
+    """Re-upload a sheet for an existing file and apply only the differences."""
+    student_file = get_object_or_404(StudentFile, pk=file_id, is_active=True)
+    form = ExcelSyncForm()
+
+    if request.method == 'POST':
+        form = ExcelSyncForm(request.POST, request.FILES)
+
+        if form.is_valid():
+            excel_file = form.cleaned_data['excel_file']
+            mapping_profile = form.cleaned_data['mapping_profile']
+
+            error = excel_upload_error(excel_file)
+            if error:
+                messages.error(request, error)
+            elif Job.objects.filter(
+                kind='student_sync',
+                status__in=('pending', 'running'),
+                payload__student_file_id=student_file.pk,
+            ).exists():
+                messages.error(request, 'A re-upload for this file is already in progress.')
+            else:
+                job = enqueue('student_sync', payload={
+                    'student_file_id': student_file.pk,
+                    'profile_id': mapping_profile.pk if mapping_profile else None,
+                    'remove_missing': form.cleaned_data['remove_missing'],
+                }, created_by=request.user, input_file=excel_file)
+
+                messages.info(request, f'Upload received. Syncing {student_file.file_name} in the background...')
+                return redirect(f"{reverse('file_sync', args=[student_file.pk])}?job={job.pk}")
+
+    job = None
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = Job.objects.filter(pk=job_id, kind='student_sync').first()
+
+    return render(request, 'students/file_sync.html', {
+        'form': form,
+        'student_file': student_file,
+        'job': job,
+    })
 
 
 @login_required
@@ -140,16 +149,7 @@ def file_list(request):
     search = request.GET.get('search', '')
     year_filter = request.GET.get('year', '')
 
-    if user.role == 'admin' or user.role == 'hod':
-        files = StudentFile.objects.filter(is_active=True)
-    elif user.role in ('teacher', 'guardian'):
-        from permissions_app.models import FilePermission
-        allowed_file_ids = FilePermission.objects.filter(
-            user=user
-        ).values_list('student_file_id', flat=True)
-        files = StudentFile.objects.filter(id__in=allowed_file_ids, is_active=True)
-    else:
-        files = StudentFile.objects.none()
+    files = accessible_files(user)
 
     if search:
         files = files.filter(
@@ -184,11 +184,9 @@ def student_list(request, file_id):
 
     # Permission check
     user = request.user
-    if user.role in ('teacher', 'guardian'):
-        from permissions_app.models import FilePermission
-        if not FilePermission.objects.filter(user=user, student_file=student_file).exists():
-            messages.error(request, 'You do not have permission to view this file.')
-            return redirect('file_list')
+    if not can_access(user, student_file.pk):
+        messages.error(request, 'You do not have permission to view this file.')
+        return redirect('file_list')
 
     search = request.GET.get('search', '')
     students = student_file.students.all()
@@ -218,11 +216,9 @@ def student_profile(request, pk):
 
     # Permission check
     user = request.user
-    if user.role in ('teacher', 'guardian'):
-        from permissions_app.models import FilePermission
-        if not FilePermission.objects.filter(user=user, student_file=student.file).exists():
-            messages.error(request, 'You do not have permission to view this student.')
-            return redirect('file_list')
+    if not can_access(user, student.file_id):
+        messages.error(request, 'You do not have permission to view this student.')
+        return redirect('file_list')
 
     return render(request, 'students/student_profile.html', {
         'student': student,
@@ -285,7 +281,10 @@ def file_delete(request, file_id):
         file_name = student_file.file_name
         
         # Actually delete the students (not just mark file as inactive)
-        student_file.students.all().delete()
+        with bulk_student_changes(student_file.pk):
+            student_file.students.all().delete()
+        invalidate_export_cache(student_file.pk)
+        invalidate_stats('students')
         
         # Now mark file as inactive
         student_file.is_active = False
@@ -300,32 +299,85 @@ def file_delete(request, file_id):
 
 @login_required
 def file_download(request, file_id):
-    """Download students as Excel."""
+    """Download students as Excel, CSV or NDJSON (?format=xlsx|csv|ndjson)."""
     student_file = get_object_or_404(StudentFile, pk=file_id, is_active=True)
 
     # Permission check
     user = request.user
-    if user.role in ('teacher', 'guardian'):
-        from permissions_app.models import FilePermission
-        if not FilePermission.objects.filter(user=user, student_file=student_file).exists():
-            messages.error(request, 'You do not have permission to download this file.')
-            return redirect('file_list')
+    if not can_access(user, student_file.pk):
+        messages.error(request, 'You do not have permission to download this file.')
+        return redirect('file_list')
 
-    students = student_file.students.all()
-    return export_students_excel(students, student_file.file_name)
+    fmt = request.GET.get('format', 'xlsx')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Unsupported format. Use xlsx, csv or ndjson.')
+
+    return export_file_response(request, student_file, fmt)
 
 
 @login_required
-def my_assigned_files(request):
-    """Show files assigned to teacher/guardian."""
-    from permissions_app.models import FilePermission
+@admin_required
+def files_export(request):
+    """Download many files as one ZIP (?year=&academic_year=&class_name=&format=)."""
+    fmt = request.GET.get('format', 'xlsx')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Unsupported format. Use xlsx, csv or ndjson.')
+
+    files = StudentFile.objects.filter(is_active=True)
+    filters = []
+    for field in ('year', 'academic_year', 'class_name'):
+        value = request.GET.get(field, '')
+        if value:
+            files = files.filter(**{field: value})
+            filters.append(value)
+
+    archive_name = '_'.join(['student_files'] + filters).replace(' ', '_')
+    return export_files_zip(files.order_by('pk'), fmt, archive_name)
+
+
+@login_required
+def file_pdfs(request, file_id):
+    """Generate profile PDFs for a whole file, or the students ticked in the list."""
+    student_file = get_object_or_404(StudentFile, pk=file_id, is_active=True)
+
+    # Permission check
+    user = request.user
+    if not can_access(user, student_file.pk):
+        messages.error(request, 'You do not have permission to download this file.')
+        return redirect('file_list')
+
+    if request.method == 'POST':
+        student_ids = [int(pk) for pk in request.POST.getlist('student_ids') if pk.isdigit()]
+        job = enqueue('student_pdfs', payload={
+            'student_file_id': student_file.pk,
+            'student_ids': student_ids,
+            'merge': request.POST.get('output', 'merged') != 'zip',
+        }, created_by=user)
+
+        count = len(student_ids) or student_file.total_students
+        messages.info(request, f'Generating {count} profile PDF(s) in the background...')
+        return redirect(f"{reverse('file_pdfs', args=[student_file.pk])}?job={job.pk}")
+
+    job = None
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        jobs = Job.objects.filter(kind='student_pdfs')
+        if user.role != 'admin':
+            jobs = jobs.filter(created_by=user)
+        job = jobs.filter(pk=job_id).first()
+
+    return render(request, 'students/file_pdfs.html', {
+        'student_file': student_file,
+        'job': job,
+    })
 
-    assigned = FilePermission.objects.filter(
-        user=request.user
-    ).select_related('student_file')
 
-    file_ids = assigned.values_list('student_file_id', flat=True)
-    files = StudentFile.objects.filter(id__in=file_ids, is_active=True)
+@login_required
+def my_assigned_files(request):
+    """Show files assigned to teacher/guardian."""
+    files = StudentFile.objects.filter(
+        id__in=accessible_file_ids(request.user) or (), is_active=True
+    )
 
     paginator = Paginator(files, 10)
     page_number = request.GET.get('page')
@@ -338,7 +390,7 @@ def my_assigned_files(request):
         'selected_year': '',
     })
 
- 
+
 @login_required
 def student_pdf(request, pk):
     """Generate PDF for student profile."""
@@ -346,32 +398,20 @@ def student_pdf(request, pk):
 
     # Permission check
     user = request.user
-    if user.role in ('teacher', 'guardian'):
-        from permissions_app.models import FilePermission
-        if not FilePermission.objects.filter(user=user, student_file=student.file).exists():
-            messages.error(request, 'You do not have permission to download this student profile.')
-            return redirect('file_list')
+    if not can_access(user, student.file_id):
+        messages.error(request, 'You do not have permission to download this student profile.')
+        return redirect('file_list')
 
     try:
-        from xhtml2pdf import pisa
-        from io import BytesIO
-        from django.template.loader import render_to_string
-
-        html_string = render_to_string('students/student_pdf.html', {
-            'student': student,
-        })
-
-        result = BytesIO()
-        pdf = pisa.CreatePDF(BytesIO(html_string.encode('utf-8')), dest=result)
-
-        if not pdf.err:
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{student.full_name}_Profile.pdf"'
-            return response
-        else:
-            messages.error(request, 'Error generating PDF.')
-            return redirect('student_profile', pk=pk)
-
+        pdf = render_student_pdf(student)
     except ImportError:
         messages.error(request, 'PDF generation is not available. Please install xhtml2pdf.')
-        return redirect('student_profile', pk=pk)
\ No newline at end of file
+        return redirect('student_profile', pk=pk)
+
+    if pdf is None:
+        messages.error(request, 'Error generating PDF.')
+        return redirect('student_profile', pk=pk)
+
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{student.full_name}_Profile.pdf"'
+    return response
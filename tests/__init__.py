@@ -1 +1,11 @@
- 
+# Query counts in the tests cover the app's own queries: classes that
+# count them use per-process caches instead of the database cache.
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+    },
+}
@@ -1,6 +1,20 @@
  
-from django.test import TestCase, Client
-from accounts.models import User
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from accounts.counters import get_unread_counters, recount_counters
+from accounts.models import User, UserCounters
+from announcements.models import Announcement, AnnouncementRead, AnnouncementWatermark
+from announcements.views import active_announcement_ids, get_role_announcements
+from notifications.models import ActivityNotification, BroadcastNotification, BroadcastRead
+from notifications.utils import send_activity_notification, send_to_all_staff, send_to_role
+from tests import LOCMEM_CACHES
 
 
 class NotificationTestCase(TestCase):
@@ -14,4 +28,243 @@ class NotificationTestCase(TestCase):
     def test_notification_list(self):
         self.client.login(username='admin1', password='adminpass123')
         response = self.client.get('/notifications/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COUNTERS_CACHE='default')
+class UnreadCounterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher',
+        )
+        self.client.login(username='teacher1', password='teacherpass123')
+
+    def notify(self):
+        send_activity_notification(self.teacher, 'general', 'Hello', 'Hi')
+
+    def badges(self):
+        return get_unread_counters(self.teacher)
+
+    def test_counters_follow_writes_without_recounting(self):
+        self.notify()
+        announcement = Announcement.objects.create(title='Exam', content='Soon', visibility='staff')
+        self.assertEqual(self.badges()['unread_activity_count'], 1)
+        self.assertEqual(self.badges()['unread_announcement_count'], 1)
+
+        # Cached: no queries at all
+        with self.assertNumQueries(0):
+            self.badges()
+
+        # Reading the announcement and a new activity update the row in place
+        self.client.get(f'/announcements/{announcement.pk}/')
+        self.notify()
+        with self.assertNumQueries(1):  # the counters row
+            counters = self.badges()
+        self.assertEqual(counters['unread_announcement_count'], 0)
+        self.assertEqual(counters['unread_activity_count'], 2)
+
+        self.client.post('/activity/mark-all-read/')
+        self.assertEqual(self.client.get('/activity/').context['unread_activity_count'], 0)
+
+    def test_recount_counters_repairs_drift(self):
+        self.badges()
+        # Written behind the counters' back
+        ActivityNotification.objects.create(recipient=self.teacher, title='Hello', message='Hi')
+        self.assertEqual(self.badges()['unread_activity_count'], 0)
+
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(UserCounters.objects.get(user=self.teacher).unread_activities, 1)
+        self.assertEqual(self.badges()['unread_activity_count'], 1)
+
+    @override_settings(COUNTERS_CACHE=None)
+    def test_database_cache_is_skipped(self):
+        self.notify()
+        self.badges()
+        # Just the counters row: a cache in the database would cost more
+        with self.assertNumQueries(1):
+            self.assertEqual(self.badges()['unread_activity_count'], 1)
+        self.notify()
+        self.assertEqual(self.badges()['unread_activity_count'], 2)
+
+    def test_mark_all_announcements_read(self):
+        for i in range(3):
+            Announcement.objects.create(title=f'Notice {i}', content='Soon', visibility='staff')
+        self.assertEqual(self.badges()['unread_announcement_count'], 3)
+
+        # A short backlog gets one receipt per announcement
+        self.client.post('/announcements/mark-all-read/')
+        self.assertEqual(AnnouncementRead.objects.filter(user=self.teacher).count(), 3)
+        self.assertEqual(self.badges()['unread_announcement_count'], 0)
+
+        # A long one moves the watermark instead
+        for i in range(3):
+            Announcement.objects.create(title=f'Later {i}', content='Soon', visibility='staff')
+        self.assertEqual(self.badges()['unread_announcement_count'], 3)
+        with mock.patch('announcements.views.MARK_ALL_RECEIPT_LIMIT', 2):
+            self.client.post('/announcements/mark-all-read/')
+        self.assertEqual(AnnouncementRead.objects.filter(user=self.teacher).count(), 3)
+        self.assertTrue(AnnouncementWatermark.objects.filter(user=self.teacher).exists())
+        self.assertEqual(self.badges()['unread_announcement_count'], 0)
+
+        # The watermark counts in list views and recounts alike
+        response = self.client.get('/announcements/')
+        self.assertEqual(response.context['unread_count'], 0)
+        self.assertEqual(recount_counters(self.teacher)['unread_announcements'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AnnouncementVisibilityTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guardian = User.objects.create_user(
+            username='guardian1', password='guardianpass123',
+            full_name='Guardian User', role='guardian',
+        )
+
+    def test_role_visibility(self):
+        staff = Announcement.objects.create(title='Staff', content='x', visibility='staff')
+        Announcement.objects.create(title='HODs', content='x', visibility='hod')
+        expired = Announcement.objects.create(
+            title='Old', content='x', expires_at=timezone.now() - timedelta(days=1),
+        )
+        self.assertEqual(set(get_role_announcements('guardian')), {staff})
+        self.assertEqual(get_role_announcements('admin').count(), 2)
+        self.assertNotIn(expired.pk, active_announcement_ids('admin'))
+
+    def test_active_ids_are_cached_until_saved(self):
+        announcement = Announcement.objects.create(title='Staff', content='x', visibility='staff')
+        self.assertIn(announcement.pk, active_announcement_ids('guardian'))
+        with self.assertNumQueries(0):
+            self.assertIn(announcement.pk, active_announcement_ids('guardian'))
+
+        announcement.visibility = 'teacher'
+        announcement.save()
+        self.assertNotIn(announcement.pk, active_announcement_ids('guardian'))
+
+    def test_detail_checks_the_cached_ids(self):
+        self.assertEqual(active_announcement_ids('guardian'), frozenset())
+        announcement = Announcement.objects.create(title='Staff', content='x', visibility='staff')
+        hidden = Announcement.objects.create(title='HODs', content='x', visibility='hod')
+
+        self.client.login(username='guardian1', password='guardianpass123')
+        response = self.client.get(f'/announcements/{announcement.pk}/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/announcements/{hidden.pk}/')
+        self.assertRedirects(response, '/announcements/')
+
+    def test_active_ids_drop_expired(self):
+        announcement = Announcement.objects.create(
+            title='Soon over', content='x', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertIn(announcement.pk, active_announcement_ids('guardian'))
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('announcements.views.time.time', return_value=later.timestamp()), \
+                mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertNotIn(announcement.pk, active_announcement_ids('guardian'))
+
+
+class BroadcastTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teachers = [
+            User.objects.create_user(
+                username=f'teacher{i}', password='teacherpass123',
+                full_name=f'Teacher {i}', role='teacher',
+            )
+            for i in range(3)
+        ]
+        for teacher in self.teachers:
+            get_unread_counters(teacher)
+        self.client.login(username='teacher0', password='teacherpass123')
+
+    def test_role_broadcast_is_one_row(self):
+        # insert + one counters UPDATE (+ savepoints)
+        with self.assertNumQueries(4):
+            send_to_role('teacher', 'general', 'Hello', 'Hi')
+        send_to_all_staff('general', 'Staff meeting', 'At 4', exclude_user=self.teachers[1])
+
+        self.assertEqual(BroadcastNotification.objects.count(), 2)
+        self.assertFalse(ActivityNotification.objects.exists())
+        self.assertEqual(
+            list(UserCounters.objects.order_by('user_id').values_list('unread_activities', flat=True)),
+            [2, 1, 2],
+        )
+
+    def test_feed_merges_personal_and_broadcast(self):
+        broadcast = send_to_role('teacher', 'general', 'Hello', 'Hi')
+        send_activity_notification(self.teachers[0], 'file_assigned', 'New file', 'FY A')
+
+        response = self.client.get('/activity/')
+        self.assertEqual([item.title for item in response.context['page_obj']], ['New file', 'Hello'])
+        self.assertEqual(response.context['unread_count'], 2)
+
+        self.client.get(f'/activity/broadcast/{broadcast.pk}/read/')
+        self.assertTrue(BroadcastRead.objects.filter(user=self.teachers[0]).exists())
+        response = self.client.get('/activity/')
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(response.context['unread_activity_count'], 1)
+
+        # Mark all read moves the watermark and drops the receipts
+        send_to_role('teacher', 'general', 'Again', 'Hi')
+        self.client.post('/activity/mark-all-read/')
+        self.assertFalse(BroadcastRead.objects.exists())
+        response = self.client.get('/activity/')
+        self.assertEqual(response.context['unread_count'], 0)
+        self.assertTrue(all(item.is_read for item in response.context['page_obj']))
+
+        # Recounting agrees with the maintained counters
+        self.assertEqual(recount_counters(self.teachers[1])['unread_activities'], 2)
+        self.assertEqual(recount_counters(self.teachers[0])['unread_activities'], 0)
+
+
+@override_settings(LIVE_UPDATES=True, EVENT_STREAM_TIMEOUT=2, EVENT_STREAM_HEARTBEAT=0.1)
+class EventStreamTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher',
+        )
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            send_activity_notification(self.teacher, 'general', 'Exam tomorrow', 'Hi', '/announcements/')
+
+    async def next_event(self, events):
+        async for chunk in events:
+            if not chunk.startswith(b':'):  # keep-alive
+                return chunk.decode()
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_off_unless_enabled(self):
+        self.client.force_login(self.teacher)
+        self.assertNotContains(self.client.get('/announcements/'), 'listenForUpdates(')
+        self.assertEqual(self.client.get('/activity/stream/').status_code, 404)
+
+    def test_pages_listen_when_enabled(self):
+        self.client.force_login(self.teacher)
+        self.assertContains(self.client.get('/announcements/'), "listenForUpdates('/activity/stream/')")
+
+    async def test_stream_pushes_counts_and_activity(self):
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.get('/activity/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        first = await self.next_event(events)
+        self.assertIn('event: counters', first)
+        self.assertIn('"unread_activity_count": 0', first)
+
+        await sync_to_async(self.notify)()
+        self.assertEqual(
+            await self.next_event(events),
+            'event: counters\ndata: {"unread_activity_count": 1}\n\n',
+        )
+        activity = await self.next_event(events)
+        self.assertIn('event: activity', activity)
+        self.assertIn('"title": "Exam tomorrow"', activity)
+
+        # The stream ends after EVENT_STREAM_TIMEOUT
+        self.assertIsNone(await self.next_event(events))
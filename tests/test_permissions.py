@@ -1,6 +1,15 @@
  
-from django.test import TestCase, Client
-from accounts.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from accounts.counters import recount_counters
+from accounts.models import User, UserCounters
+from notifications.models import ActivityNotification
+from permissions_app.access import accessible_file_ids, can_access
+from permissions_app.models import FilePermission
+from students.models import StudentFile
+from tests import LOCMEM_CACHES
 
 
 class PermissionTestCase(TestCase):
@@ -23,4 +32,167 @@ class PermissionTestCase(TestCase):
     def test_admin_can_access_admin_panel(self):
         self.client.login(username='admin1', password='adminpass123')
         response = self.client.get('/admin-panel/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PermissionSaveTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher',
+        )
+        self.files = StudentFile.objects.bulk_create([
+            StudentFile(
+                file_name=f'FY_{i}_BSc_2024-2025', class_name='BSc',
+                division=str(i), year='FY', academic_year='2024-2025',
+            )
+            for i in range(200)
+        ])
+        recount_counters(self.teacher)
+        self.client.login(username='admin1', password='adminpass123')
+
+    def save(self, files):
+        return self.client.post(
+            f'/permissions/save/{self.teacher.pk}/', {'files': [f.pk for f in files]},
+        )
+
+    def test_save_is_a_diff(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.save(self.files)
+        self.assertLess(len(queries), 20)
+        self.assertEqual(FilePermission.objects.filter(user=self.teacher).count(), 200)
+        self.assertEqual(ActivityNotification.objects.filter(recipient=self.teacher).count(), 200)
+        self.assertEqual(UserCounters.objects.get(user=self.teacher).unread_activities, 200)
+
+        # Kept permissions are left alone
+        kept = FilePermission.objects.get(user=self.teacher, student_file=self.files[0])
+        self.save(self.files[:150])
+        self.assertEqual(FilePermission.objects.filter(user=self.teacher).count(), 150)
+        self.assertEqual(FilePermission.objects.get(user=self.teacher, student_file=self.files[0]), kept)
+        self.assertEqual(
+            ActivityNotification.objects.filter(
+                recipient=self.teacher, notification_type='permission_revoked'
+            ).count(),
+            50,
+        )
+
+    def test_year_form_only_changes_that_year(self):
+        sy_file = StudentFile.objects.create(
+            file_name='SY_A_BSc_2024-2025', class_name='BSc',
+            division='A', year='SY', academic_year='2024-2025',
+        )
+        self.save([sy_file, self.files[0]])
+
+        self.client.post(f'/permissions/save/{self.teacher.pk}/', {'year': 'FY', 'files': []})
+        self.assertEqual(
+            list(FilePermission.objects.filter(user=self.teacher).values_list('student_file', flat=True)),
+            [sy_file.pk],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PermissionMatrixTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        self.files = StudentFile.objects.bulk_create([
+            StudentFile(
+                file_name=f'FY_{i}_BSc_2024-2025', class_name='BSc',
+                division=str(i), year='FY', academic_year='2024-2025',
+            )
+            for i in range(5)
+        ])
+        self.client.login(username='admin1', password='adminpass123')
+
+    def add_staff(self, count, department='Science'):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(
+                username=f'teacher{i}', password='teacherpass123',
+                full_name=f'Teacher {i}', role='teacher', department=department,
+            )
+            FilePermission.objects.create(user=user, student_file=self.files[i % 5])
+        return user
+
+    def test_matrix_queries_do_not_grow_with_staff(self):
+        self.add_staff(3)
+        self.client.get('/permissions/')  # badge counters
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/permissions/')
+        self.add_staff(20)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/permissions/')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual([s.granted_count for s in response.context['page_obj']], [1] * 23)
+
+    def test_filters_and_lazy_files(self):
+        teacher = self.add_staff(2)
+        self.add_staff(1, department='Arts')
+
+        response = self.client.get('/permissions/', {'department': 'Arts'})
+        self.assertEqual(len(response.context['page_obj']), 1)
+        response = self.client.get('/permissions/', {'year': 'SY'})
+        self.assertEqual(response.context['file_count'], 0)
+
+        response = self.client.get(f'/permissions/{teacher.pk}/files/')
+        self.assertEqual(len(response.context['files']), 5)
+        self.assertEqual(len(response.context['granted']), 1)
+
+    def test_page_links_keep_encoded_filters(self):
+        self.add_staff(30, department='R&D')
+        response = self.client.get('/permissions/', {'department': 'R&D', 'search': 'Teacher #1'})
+        self.assertEqual(response.context['filter_query'], 'search=Teacher+%231&department=R%26D')
+        response = self.client.get('/permissions/', {'department': 'R&D'})
+        self.assertContains(response, '?page=2&department=R%26D')
+
+
+class FileAccessTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher',
+        )
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc',
+            division='A', year='FY', academic_year='2024-2025',
+        )
+
+    def test_access_follows_permission_save(self):
+        self.client.login(username='teacher1', password='teacherpass123')
+        self.assertEqual(self.client.get(f'/files/{self.student_file.pk}/').status_code, 302)
+        self.assertFalse(self.client.get('/files/').context['page_obj'])
+
+        admin = Client()
+        admin.login(username='admin1', password='adminpass123')
+        admin.post(f'/permissions/save/{self.teacher.pk}/', {'files': [self.student_file.pk]})
+        self.assertEqual(self.client.get(f'/files/{self.student_file.pk}/').status_code, 200)
+        self.assertEqual(list(self.client.get('/files/').context['page_obj']), [self.student_file])
+
+        admin.post(f'/permissions/save/{self.teacher.pk}/', {'files': []})
+        self.assertEqual(self.client.get(f'/files/{self.student_file.pk}/').status_code, 302)
+
+    def test_grants_are_read_once_per_request(self):
+        FilePermission.objects.create(user=self.teacher, student_file=self.student_file)
+        self.assertTrue(can_access(self.teacher, self.student_file.pk))
+
+        # Memoized on the user object
+        with self.assertNumQueries(0):
+            self.assertTrue(can_access(self.teacher, self.student_file.pk))
+        self.assertIsNone(accessible_file_ids(self.admin))
+
+        # The next request (a new user object) sees changes made anywhere
+        FilePermission.objects.filter(user=self.teacher).get().delete()
+        teacher = User.objects.get(pk=self.teacher.pk)
+        self.assertFalse(can_access(teacher, self.student_file.pk))
@@ -0,0 +1,328 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from accounts.models import SecurityLog, User
+from jobs.models import Job
+from jobs.utils import claim_next_job, run_job
+from notifications.models import Notification
+from permissions_app.models import FilePermission
+from reports.metrics import get_stat, get_stats
+from reports.models import DailyActivity, ReportSnapshot, StudentRollup, SummaryReport
+from reports.snapshots import get_report_stats, rebuild_daily_activity, rebuild_student_rollup
+from reports.stats import compute_report_stats, rollup_report_stats, upload_timeline
+from reports.summary import build_summary_report, queue_summary_report
+from students.models import Student, StudentFile
+from tests import LOCMEM_CACHES
+
+
+class ReportStatsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher', department='Science',
+        )
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc',
+            division='A', year='FY', academic_year='2024-2025',
+        )
+        cache.clear()
+        self.client.login(username='admin1', password='adminpass123')
+
+    def add_students(self, count, **fields):
+        start = Student.objects.count()
+        fields = dict({'class_name': 'BSc', 'division': 'A', 'year': 'FY'}, **fields)
+        Student.objects.bulk_create([
+            Student(
+                file=self.student_file, roll_no=str(i), prn=f'PRN-{i}', full_name=f'Student {i}',
+                **fields,
+            )
+            for i in range(start, start + count)
+        ])
+        # bulk_create skips signals, as in imports
+        rebuild_student_rollup(self.student_file.pk)
+
+    def test_stats(self):
+        self.add_students(3)
+        self.add_students(2, division='B', status='marked')
+        student = Student.objects.first()
+        Notification.objects.create(
+            student=student, student_file=self.student_file, requested_by=self.teacher,
+            field_to_edit='phone', remark='Wrong number',
+        )
+
+        with self.assertNumQueries(6):
+            stats = compute_report_stats()
+        self.assertEqual(stats.total_students, 5)
+        self.assertEqual(stats.students_by_division, {'A': 3, 'B': 2})
+        self.assertEqual(stats.students_by_status, {'marked': 2, 'normal': 3})
+        self.assertEqual(stats.staff_by_role, {'admin': 1, 'teacher': 1})
+        self.assertEqual(stats.staff_by_department_role, {'Science': {'teacher': 1}})
+        self.assertEqual(stats.pending_notifications, 1)
+        self.assertEqual(stats.top_edit_fields(), [('phone', 1)])
+        self.assertEqual(stats.logins_today, SecurityLog.objects.filter(action='login').count())
+
+    @override_settings(REPORT_SNAPSHOT_MAX_AGE=0)
+    def test_dashboard_queries_do_not_grow(self):
+        self.add_students(5)
+        self.client.get('/reports/')  # badge counters
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/reports/')
+        self.add_students(200, division='C')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/reports/')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(response.context['stats'].total_students, 205)
+
+    def test_rollups_follow_changes(self):
+        self.add_students(3)
+        student = Student.objects.create(
+            file=self.student_file, roll_no='10', prn='PRN-10', full_name='New Student',
+            class_name='BSc', division='B', year='FY',
+        )
+        moved = Student.objects.get(roll_no='0')
+        moved.status = 'marked'
+        moved.save()
+        Student.objects.get(roll_no='1').delete()
+        student.division = 'C'
+        student.save(update_fields=['division'])
+
+        stats = rollup_report_stats()
+        self.assertEqual(stats.students_by_division, {'A': 2, 'C': 1})
+        self.assertEqual(stats.students_by_status, {'marked': 1, 'normal': 2})
+        self.assertEqual(stats.to_json(), compute_report_stats().to_json())
+
+        SecurityLog.objects.create(user=self.teacher, action='login')
+        self.assertEqual(rollup_report_stats().logins_today, compute_report_stats().logins_today)
+
+    def test_bulk_deletes_recount_once(self):
+        self.add_students(5)
+        other = StudentFile.objects.create(
+            file_name='SY_A_BSc_2024-2025', class_name='BSc',
+            division='A', year='SY', academic_year='2024-2025',
+        )
+        Student.objects.create(file=other, roll_no='1', prn='PRN-SY-1', full_name='Other Student')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/files/{self.student_file.pk}/delete/')
+            other.delete()
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "reports_studentrollup"')]
+        self.assertEqual(updates, [])
+        self.assertFalse(StudentRollup.objects.exists())
+        self.assertEqual(rollup_report_stats().total_students, 0)
+
+        # Single deletes are still counted
+        self.student_file.is_active = True
+        self.student_file.save()
+        self.add_students(2)
+        Student.objects.first().delete()
+        self.assertEqual(rollup_report_stats().total_students, 1)
+
+    def test_snapshot_reused(self):
+        self.add_students(2)
+        first = get_report_stats()
+        self.add_students(1)
+        self.assertEqual(get_report_stats().total_students, 2)
+        self.assertEqual(get_report_stats(max_age=0).total_students, 3)
+        self.assertEqual(ReportSnapshot.objects.count(), 2)
+        self.assertIsNotNone(first.taken_at)
+
+    def test_refresh_command(self):
+        self.add_students(4)
+        StudentRollup.objects.all().delete()
+        call_command('refresh_report_snapshots', stdout=StringIO())
+        self.assertEqual(ReportSnapshot.objects.first().stats['students_by_class'], {'BSc': 4})
+
+    def test_upload_timeline(self):
+        # Imports add the file inactive and activate it with its count
+        student_file = StudentFile.objects.create(
+            file_name='SY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='SY', academic_year='2024-2025', is_active=False,
+        )
+        student_file.total_students = 40
+        student_file.is_active = True
+        student_file.save(update_fields=['total_students', 'is_active'])
+        self.student_file.total_students = 3
+        self.student_file.save()
+        # The file's students are not joined in
+        self.add_students(3)
+
+        today = timezone.localdate()
+        self.assertEqual(upload_timeline(30), [(today, 2, 43)])
+
+        self.client.post(f'/files/{student_file.pk}/delete/')
+        self.assertEqual(upload_timeline(30), [(today, 1, 3)])
+
+        DailyActivity.objects.all().delete()
+        rebuild_daily_activity()
+        self.assertEqual(upload_timeline(30), [(today, 1, 3)])
+
+    def test_upload_history_range(self):
+        old = timezone.now() - timedelta(days=60)
+        StudentFile.objects.filter(pk=self.student_file.pk).update(upload_date=old, total_students=5)
+        rebuild_daily_activity()
+
+        response = self.client.get('/reports/')
+        self.assertEqual(response.context['upload_range'], 30)
+        self.assertEqual(response.context['upload_counts'], '[]')
+        response = self.client.get('/reports/?range=90')
+        self.assertEqual(response.context['upload_counts'], '[1]')
+        self.assertEqual(response.context['upload_student_counts'], '[5]')
+        response = self.client.get('/reports/?range=7')
+        self.assertEqual(response.context['upload_range'], 30)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StatsServiceTestCase(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            username='teacher1', password='teacherpass123',
+            full_name='Teacher User', role='teacher',
+        )
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc',
+            division='A', year='FY', academic_year='2024-2025',
+        )
+        self.student = Student.objects.create(
+            file=self.student_file, roll_no='1', prn='PRN-1', full_name='Student 1',
+            class_name='BSc', division='A', year='FY',
+        )
+        cache.clear()
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(get_stats('total_students', 'staff_by_role'), {
+            'total_students': 1, 'staff_by_role': {'teacher': 1},
+        })
+        with self.assertNumQueries(0):
+            get_stats('total_students', 'staff_by_role')
+
+        Student.objects.create(
+            file=self.student_file, roll_no='2', prn='PRN-2', full_name='Student 2',
+            class_name='BSc', division='A', year='FY',
+        )
+        self.assertEqual(get_stat('total_students'), 2)
+
+        # Logins save last_login only
+        self.client.login(username='teacher1', password='teacherpass123')
+        with self.assertNumQueries(0):
+            get_stat('staff_by_role')
+        self.teacher.is_active = False
+        self.teacher.save()
+        self.assertEqual(get_stat('staff_by_role'), {})
+
+    def test_per_user_metrics(self):
+        other = User.objects.create_user(
+            username='teacher2', password='teacherpass123',
+            full_name='Other Teacher', role='teacher',
+        )
+        self.assertEqual(get_stat('assigned_students', self.teacher), 0)
+        self.assertEqual(get_stat('requests_by_status', other), {})
+
+        FilePermission.objects.create(user=self.teacher, student_file=self.student_file)
+        Notification.objects.create(
+            student=self.student, student_file=self.student_file, requested_by=self.teacher,
+            field_to_edit='phone', remark='Wrong number',
+        )
+        teacher = User.objects.get(pk=self.teacher.pk)  # file ids are memoized per user object
+        self.assertEqual(get_stat('assigned_students', teacher), 1)
+        self.assertEqual(get_stat('requests_by_status', self.teacher), {'pending': 1})
+        # Other users' entries stay cached
+        with self.assertNumQueries(0):
+            get_stat('requests_by_status', other)
+
+    def test_teacher_dashboard(self):
+        FilePermission.objects.create(user=self.teacher, student_file=self.student_file)
+        self.client.login(username='teacher1', password='teacherpass123')
+        response = self.client.get('/teacher-panel/')
+        self.assertEqual(response.context['stats'], {
+            'assigned_files': 1, 'total_students': 1, 'my_requests': 0, 'pending_requests': 0,
+        })
+
+
+class SummaryReportTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        cache.clear()
+        self.client.login(username='admin1', password='adminpass123')
+
+    def test_built_in_background_then_served(self):
+        response = self.client.get('/reports/export-pdf/')
+        job = Job.objects.get(kind='summary_pdf')
+        self.assertRedirects(response, f'/reports/?job={job.pk}')
+
+        run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        report = SummaryReport.objects.get()
+        self.assertEqual(job.result_url, f'/reports/summary/{report.pk}/')
+
+        response = self.client.get('/reports/export-pdf/')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_stale_report_served_while_rebuilding(self):
+        report = build_summary_report()
+        SummaryReport.objects.filter(pk=report.pk).update(taken_at=timezone.now() - timedelta(days=1))
+
+        for _ in range(2):
+            response = self.client.get('/reports/export-pdf/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(Job.objects.filter(kind='summary_pdf', status='pending').count(), 1)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_rebuild_is_served(self):
+        report = build_summary_report()
+        SummaryReport.objects.filter(pk=report.pk).update(taken_at=timezone.now() - timedelta(days=1))
+
+        response = self.client.get('/reports/export-pdf/')
+        job = Job.objects.get(kind='summary_pdf')
+        self.assertEqual(job.status, 'done')
+        new_report = SummaryReport.objects.exclude(pk=report.pk).get()
+        self.assertEqual(job.result_url, f'/reports/summary/{new_report.pk}/')
+        self.assertIn(new_report.pdf.name.rsplit('/', 1)[-1], response['Content-Disposition'])
+
+    def test_stuck_job_does_not_block_rebuilds(self):
+        job = queue_summary_report()
+        Job.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now() - timedelta(hours=1))
+
+        response = self.client.get('/reports/export-pdf/')
+        new_job = Job.objects.get(kind='summary_pdf', status='pending')
+        self.assertRedirects(response, f'/reports/?job={new_job.pk}')
+
+    def test_one_report_per_snapshot(self):
+        self.assertEqual(build_summary_report().pk, build_summary_report().pk)
+
+    def test_pdf_not_available(self):
+        with mock.patch('reports.views.pdf_available', return_value=False):
+            response = self.client.get('/reports/export-pdf/')
+        self.assertRedirects(response, '/reports/')
+        self.assertFalse(Job.objects.exists())
+
+    def test_daily_report_command(self):
+        call_command('generate_daily_report', stdout=StringIO())
+        report = SummaryReport.objects.get()
+        self.assertEqual(report.taken_at, ReportSnapshot.objects.first().taken_at)
+        with report.pdf.open('rb') as pdf:
+            self.assertEqual(pdf.read(4), b'%PDF')
@@ -1,6 +1,24 @@
- 
-from django.test import TestCase, Client
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
 from accounts.models import User
+from jobs.models import Job
+from jobs.utils import claim_job, recover_stale_jobs, run_job
+from students.models import StudentFile, Student, ColumnMappingProfile
+from students.utils import (
+    ExcelImportError, count_rejected, read_excel_students, import_students, sync_students,
+)
 
 
 class StudentTestCase(TestCase):
@@ -20,4 +38,433 @@ class StudentTestCase(TestCase):
 
     def test_upload_page(self):
         response = self.client.get('/upload/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+
+def build_workbook(rows):
+    """Return an in-memory .xlsx file containing the given rows."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class ExcelImportTestCase(TestCase):
+    def setUp(self):
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025',
+            class_name='BSc',
+            division='A',
+            year='FY',
+            academic_year='2024-2025',
+        )
+
+    def test_rows_are_streamed_and_validated(self):
+        errors = []
+        profile, rows = read_excel_students(build_workbook([
+            ['Roll No', 'Student Name', 'DOB', 'Gender'],
+            [1, 'Asha Patil', datetime(2005, 3, 14), 'Female'],
+            [None, 'No Roll', None, ''],
+            [1, 'Duplicate Roll', None, ''],
+            [2, 'Ravi Kumar', '2004-11-02', 'MALE'],
+        ]), errors)
+
+        imported = import_students(self.student_file, rows, batch_size=1)
+
+        self.assertEqual(imported, 2)
+        self.assertEqual(len(errors), 2)
+        asha = Student.objects.get(file=self.student_file, roll_no='1')
+        self.assertEqual(asha.birthdate, date(2005, 3, 14))
+        self.assertEqual(asha.gender, 'female')
+        self.assertEqual(asha.prn, 'PRN-1')
+        self.assertEqual(asha.class_name, 'BSc')
+
+    def test_columns_are_normalized_and_bad_values_blanked(self):
+        errors = []
+        profile, rows = read_excel_students(build_workbook([
+            ['Roll No', 'Name', 'Birth Date', 'Gender', 'Mobile', 'Email'],
+            [1, 'Asha Patil', 38425, 'F', '+91 98765-43210', 'Asha@Example.com'],
+            [2, 'Ravi Kumar', '02/11/2004', 'm', 9876543210.0, ''],
+            [3, 'Kiran Rao', '14/03/2005', 'x', '', 'not-an-email'],
+            ['', 'No Roll', '', '', '', ''],
+        ]), errors)
+        students = list(rows)
+
+        self.assertEqual([s['roll_no'] for s in students], ['1', '2', '3'])
+        self.assertEqual(students[0]['birthdate'], date(2005, 3, 14))
+        self.assertEqual(students[0]['gender'], 'female')
+        self.assertEqual(students[0]['phone'], '+919876543210')
+        self.assertEqual(students[0]['email'], 'asha@example.com')
+        self.assertEqual(students[1]['birthdate'], date(2004, 11, 2))
+        self.assertEqual(students[1]['phone'], '9876543210')
+        self.assertEqual((students[2]['gender'], students[2]['email']), ('', ''))
+        self.assertEqual(students[2]['birthdate'], date(2005, 3, 14))
+        self.assertEqual(errors, [
+            "Row 4: Invalid email 'not-an-email', gender 'x' left blank",
+            'Row 5: Missing roll number',
+        ])
+        self.assertEqual(count_rejected(errors), 1)
+
+    def test_missing_required_column(self):
+        with self.assertRaises(ExcelImportError):
+            read_excel_students(build_workbook([['PRN', 'Student Name']]), [])
+
+    def test_best_matching_profile_is_detected(self):
+        other = ColumnMappingProfile.objects.create(
+            name='Other University', aliases={'phone': ['cell']},
+        )
+        seat_no = ColumnMappingProfile.objects.create(
+            name='Seat Numbers',
+            aliases={'roll_no': ['Seat No'], 'full_name': ['Candidate Name']},
+        )
+        errors = []
+        profile, rows = read_excel_students(build_workbook([
+            ['Seat_No.', 'CANDIDATE NAME', 'Mobile'],
+            [7, 'Meera Joshi', '9876543210'],
+        ]), errors, [other, seat_no])
+
+        self.assertEqual(profile, seat_no)
+        self.assertEqual(list(rows)[0]['roll_no'], '7')
+
+
+class SyncStudentsTestCase(TestCase):
+    def setUp(self):
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025',
+            class_name='BSc',
+            division='A',
+            year='FY',
+            academic_year='2024-2025',
+        )
+        import_students(self.student_file, [
+            {'roll_no': '1', 'prn': 'P1', 'full_name': 'Asha Patil', 'phone': '9000000001'},
+            {'roll_no': '2', 'prn': 'P2', 'full_name': 'Ravi Kumar', 'phone': '9000000002'},
+            {'roll_no': '3', 'prn': 'P3', 'full_name': 'Kiran Rao', 'phone': '9000000003'},
+            {'roll_no': '4', 'prn': 'P4', 'full_name': 'Meera Joshi', 'phone': '9000000004'},
+        ])
+
+    def test_only_changed_rows_are_written(self):
+        untouched = Student.objects.get(file=self.student_file, roll_no='1')
+        profile, rows = read_excel_students(build_workbook([
+            ['Roll No', 'PRN', 'Name', 'Phone'],
+            [1, 'P1', 'Asha Patil', '9000000001'],
+            [2, 'P2', 'Ravi Kumar', '9111111111'],
+            [30, 'P3', 'Kiran Rao', '9000000003'],
+            [5, 'P5', 'Neha Shah', ''],
+        ]), [])
+
+        stats = sync_students(self.student_file, rows)
+
+        self.assertEqual(stats, {'created': 1, 'updated': 2, 'deleted': 1, 'unchanged': 1})
+        students = {s.roll_no: s for s in self.student_file.students.all()}
+        self.assertEqual(sorted(students), ['1', '2', '30', '5'])
+        self.assertEqual(students['2'].phone, '9111111111')
+        self.assertEqual(students['1'].updated_at, untouched.updated_at)
+
+    def test_renumbered_students_keep_their_record(self):
+        ids = dict(self.student_file.students.values_list('prn', 'pk'))
+        Student.objects.filter(prn='P2').update(status='marked')
+        profile, rows = read_excel_students(build_workbook([
+            ['Roll No', 'PRN', 'Name', 'Phone'],
+            [1, 'P2', 'Ravi Kumar', '9000000002'],
+            [2, 'P3', 'Kiran Rao', '9000000003'],
+            [3, 'P4', 'Meera Joshi', '9000000004'],
+        ]), [])
+
+        stats = sync_students(self.student_file, rows)
+
+        self.assertEqual(stats, {'created': 0, 'updated': 3, 'deleted': 1, 'unchanged': 0})
+        students = {s.prn: s for s in self.student_file.students.all()}
+        self.assertEqual({prn: s.roll_no for prn, s in students.items()}, {'P2': '1', 'P3': '2', 'P4': '3'})
+        self.assertEqual({prn: s.pk for prn, s in students.items()}, {prn: ids[prn] for prn in students})
+        self.assertEqual(students['P2'].status, 'marked')
+
+    def test_sheet_without_prn_keeps_stored_prns(self):
+        profile, rows = read_excel_students(build_workbook([
+            ['Roll No', 'Name', 'Phone'],
+            [1, 'Asha Patil', '9000000001'],
+            [2, 'Ravi Kumar', '9111111111'],
+            [3, 'Kiran Rao', '9000000003'],
+            [4, 'Meera Joshi', '9000000004'],
+            [5, 'Neha Shah', ''],
+        ]), [])
+
+        stats = sync_students(self.student_file, rows)
+
+        self.assertEqual(stats, {'created': 1, 'updated': 1, 'deleted': 0, 'unchanged': 3})
+        self.assertEqual(
+            dict(self.student_file.students.values_list('roll_no', 'prn')),
+            {'1': 'P1', '2': 'P2', '3': 'P3', '4': 'P4', '5': 'PRN-5'},
+        )
+
+    def test_empty_sheet_does_not_wipe_file(self):
+        profile, rows = read_excel_students(build_workbook([['Roll No', 'Name']]), [])
+        with self.assertRaises(ExcelImportError):
+            sync_students(self.student_file, rows)
+        self.assertEqual(self.student_file.students.count(), 4)
+
+
+class MediaTestCase(TestCase):
+    """Logged in as an admin, with uploads and job results in a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = Client()
+        User.objects.create_user(
+            username='admin1', password='adminpass123',
+            full_name='Admin User', role='admin',
+        )
+        self.client.login(username='admin1', password='adminpass123')
+
+
+class UploadJobTestCase(MediaTestCase):
+    def test_upload_is_imported_by_worker(self):
+        sheet = build_workbook([
+            ['Roll No', 'Name'],
+            [1, 'Asha Patil'],
+            [2, ''],
+            [3, 'Ravi Kumar'],
+        ])
+        response = self.client.post('/files/upload/', {
+            'class_name': 'BSc',
+            'division': 'A',
+            'year': 'FY',
+            'academic_year': '2024-2025',
+            'excel_file': SimpleUploadedFile('class.xlsx', sheet.getvalue()),
+        })
+
+        job = Job.objects.get(kind='student_import')
+        self.assertRedirects(response, f'/files/upload/?job={job.pk}')
+        self.assertEqual(job.status, 'pending')
+        self.assertFalse(StudentFile.objects.exists())
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+
+        status = self.client.get(f'/jobs/{job.pk}/').json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress'], {'parsed': 3, 'inserted': 2, 'rejected': 1})
+
+        student_file = StudentFile.objects.get(is_active=True)
+        self.assertEqual(student_file.total_students, 2)
+        self.assertEqual(status['result_url'], f'/files/{student_file.pk}/')
+
+    def test_abandoned_import_is_recovered(self):
+        upload = {
+            'class_name': 'BSc', 'division': 'A', 'year': 'FY', 'academic_year': '2024-2025',
+        }
+        sheet = build_workbook([['Roll No', 'Name'], [1, 'Asha Patil']])
+        self.client.post('/files/upload/', dict(upload, excel_file=SimpleUploadedFile('class.xlsx', sheet.getvalue())))
+        job = Job.objects.get(kind='student_import')
+        # The worker died after adding the hidden file
+        student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='FY', academic_year='2024-2025', is_active=False,
+        )
+        Job.objects.filter(pk=job.pk).update(
+            status='running', started_at=timezone.now() - timedelta(hours=2),
+            payload=dict(job.payload, student_file_id=student_file.pk),
+        )
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(StudentFile.objects.filter(pk=student_file.pk).exists())
+        self.client.post('/files/upload/', dict(upload, excel_file=SimpleUploadedFile('class.xlsx', sheet.getvalue())))
+        self.assertEqual(Job.objects.filter(kind='student_import', status='pending').count(), 1)
+
+    def test_job_given_up_on_stays_failed(self):
+        def slow(job):
+            # Runs past JOBS_STALE_AFTER; another worker recovers it
+            Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=2))
+            recover_stale_jobs()
+
+        job = Job.objects.create(kind='slow')
+        claim_job(job)
+        with mock.patch.dict('jobs.utils._handlers', slow=slow):
+            run_job(job)
+
+        self.assertEqual(job.status, 'failed')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.errors, ['The worker stopped before the job finished.'])
+
+    def test_reupload_is_synced_by_worker(self):
+        student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='FY', academic_year='2024-2025', total_students=1,
+        )
+        import_students(student_file, [{'roll_no': '1', 'prn': 'P1', 'full_name': 'Asha Patil'}])
+        self.assertEqual(self.client.get(f'/files/{student_file.pk}/sync/').status_code, 200)
+
+        sheet = build_workbook([['Roll No', 'PRN', 'Name'], [1, 'P1', 'Asha Patil'], [2, 'P2', 'Ravi Kumar']])
+        response = self.client.post(f'/files/{student_file.pk}/sync/', {
+            'excel_file': SimpleUploadedFile('class.xlsx', sheet.getvalue()),
+            'remove_missing': 'on',
+        })
+        job = Job.objects.get(kind='student_sync')
+        self.assertRedirects(response, f'/files/{student_file.pk}/sync/?job={job.pk}')
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.progress['inserted'], 1)
+        student_file.refresh_from_db()
+        self.assertEqual(student_file.total_students, 2)
+
+
+class ProfilePdfJobTestCase(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='FY', academic_year='2024-2025', total_students=2,
+        )
+        import_students(self.student_file, [
+            {'roll_no': '1', 'prn': 'P1', 'full_name': 'Asha Patil'},
+            {'roll_no': '2', 'prn': 'P2', 'full_name': 'Ravi Kumar'},
+        ])
+
+    def run_pdf_job(self, data):
+        url = f'/files/{self.student_file.pk}/pdfs/'
+        response = self.client.post(url, data)
+        job = Job.objects.get(kind='student_pdfs')
+        self.assertRedirects(response, f'{url}?job={job.pk}')
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        status = self.client.get(f'/jobs/{job.pk}/').json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['result_url'], f'/jobs/{job.pk}/result/')
+        self.assertContains(self.client.get(f'{url}?job={job.pk}'), 'PDF job')
+        return status, b''.join(self.client.get(status['result_url']).streaming_content)
+
+    def test_selected_students_as_zip(self):
+        student = self.student_file.students.get(roll_no='2')
+        status, content = self.run_pdf_job({'student_ids': [student.pk], 'output': 'zip'})
+
+        self.assertEqual(status['progress'], {'total': 1, 'rendered': 1, 'rejected': 0})
+        archive = zipfile.ZipFile(BytesIO(content))
+        self.assertEqual(archive.namelist(), ['2_Ravi Kumar_Profile.pdf'])
+        self.assertTrue(archive.read('2_Ravi Kumar_Profile.pdf').startswith(b'%PDF'))
+
+    @override_settings(PDF_WORKERS=2)
+    def test_whole_file_merged_in_worker_processes(self):
+        from pypdf import PdfReader
+
+        status, content = self.run_pdf_job({'output': 'merged'})
+
+        self.assertEqual(status['progress']['rendered'], 2)
+        self.assertGreaterEqual(len(PdfReader(BytesIO(content)).pages), 2)
+
+
+class ExportTestCase(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student_file = StudentFile.objects.create(
+            file_name='FY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='FY', academic_year='2024-2025',
+        )
+        import_students(self.student_file, [
+            {'roll_no': '1', 'prn': 'P1', 'full_name': 'Asha Patil',
+             'gender': 'female', 'birthdate': date(2005, 3, 14)},
+        ])
+
+    def test_xlsx_download(self):
+        response = self.client.get(f'/files/{self.student_file.pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('FY_A_BSc_2024-2025.xlsx', response['Content-Disposition'])
+
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(wb.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:4], ('Roll No', 'PRN', 'ABC ID', 'Full Name'))
+        self.assertEqual(rows[1][0], '1')
+        self.assertEqual(rows[1][8:10], ('2005-03-14', 'Female'))
+
+    def test_csv_and_ndjson_downloads(self):
+        url = f'/files/{self.student_file.pk}/download/'
+
+        csv_text = b''.join(self.client.get(url, {'format': 'csv'}).streaming_content).decode()
+        lines = csv_text.splitlines()
+        self.assertTrue(lines[0].startswith('Roll No,PRN,ABC ID,Full Name'))
+        self.assertTrue(lines[1].startswith('1,P1,,Asha Patil'))
+
+        ndjson = b''.join(self.client.get(url, {'format': 'ndjson'}).streaming_content).decode()
+        record = json.loads(ndjson.splitlines()[0])
+        self.assertEqual(record['full_name'], 'Asha Patil')
+        self.assertEqual(record['birthdate'], '2005-03-14')
+
+        self.assertEqual(self.client.get(url, {'format': 'pdf'}).status_code, 400)
+
+    def test_download_cache(self):
+        url = f'/files/{self.student_file.pk}/download/'
+        cache_dir = os.path.join(self.media_root, 'export_cache', str(self.student_file.pk))
+
+        first = self.client.get(url, {'format': 'csv'})
+        b''.join(first.streaming_content)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        # Unchanged roster: conditional request gets a 304, plain one the same file
+        response = self.client.get(url, {'format': 'csv'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(4):  # session, user, file, cache key
+            response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response['ETag'], first['ETag'])
+        b''.join(response.streaming_content)
+
+        # Editing a student drops the cached export and changes the ETag
+        student = self.student_file.students.get()
+        student.full_name = 'Asha P. Patil'
+        student.save()
+        self.assertFalse(os.path.exists(cache_dir))
+
+        response = self.client.get(url, {'format': 'csv'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertIn('Asha P. Patil', b''.join(response.streaming_content).decode())
+
+    def test_deleting_a_file_drops_its_exports_once(self):
+        import_students(self.student_file, [
+            {'roll_no': str(i), 'full_name': f'Student {i}'} for i in range(2, 6)
+        ])
+        url = f'/files/{self.student_file.pk}/download/'
+        b''.join(self.client.get(url, {'format': 'csv'}).streaming_content)
+        cache_dir = os.path.join(self.media_root, 'export_cache', str(self.student_file.pk))
+
+        with mock.patch('students.exports.shutil.rmtree', wraps=shutil.rmtree) as rmtree:
+            self.client.post(f'/files/{self.student_file.pk}/delete/')
+        self.assertEqual(rmtree.call_count, 1)
+        self.assertFalse(os.path.exists(cache_dir))
+
+        with mock.patch('students.exports.shutil.rmtree') as rmtree:
+            StudentFile.objects.get(pk=self.student_file.pk).delete()
+        self.assertEqual(rmtree.call_count, 1)
+
+    def test_bulk_zip_export(self):
+        other = StudentFile.objects.create(
+            file_name='SY_A_BSc_2024-2025', class_name='BSc', division='A',
+            year='SY', academic_year='2024-2025',
+        )
+        response = self.client.get('/files/export/', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [
+            'FY_A_BSc_2024-2025.csv', 'SY_A_BSc_2024-2025.csv',
+        ])
+        lines = archive.read('FY_A_BSc_2024-2025.csv').decode().splitlines()
+        self.assertTrue(lines[1].startswith('1,P1,,Asha Patil'))
+        self.assertEqual(len(archive.read(f'{other.file_name}.csv').decode().splitlines()), 1)
+
+        response = self.client.get('/files/export/', {'year': 'SY'})
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['SY_A_BSc_2024-2025.xlsx'])
+        self.assertIn('student_files_SY.zip', response['Content-Disposition'])